@@ -0,0 +1,206 @@
+import math
+import time
+from array import array
+
+from config import (
+    SEARCH_RATE, SEARCH_BURST, LINK_RATE, LINK_BURST, VERIFY_RATE, VERIFY_BURST,
+    LOCKOUT_FAILURES, LOCKOUT_DURATION, ADMISSION_IDLE_TIMEOUT
+)
+from metrics import metrics
+
+# Request kinds, each with its own bucket per user
+SEARCH = 0
+LINK = 1
+VERIFY = 2
+KINDS = 3
+
+# Fibonacci hashing spreads consecutive user ids over the table
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MIN_TABLE_BITS = 10
+
+def wait_text(seconds: float) -> str:
+    """'45s' or '12 min', for telling a refused user when to come back"""
+    seconds = math.ceil(seconds)
+    return f"{seconds}s" if seconds < 120 else f"{math.ceil(seconds / 60)} min"
+
+class AdmissionControl:
+    """Per-user token buckets for searches, verification links and /verify attempts, checked before any work
+
+    Users are rows of parallel arrays instead of an object each: the user id,
+    refill time and lockout end as 8-byte numbers, a float32 token count per
+    kind, a byte of failures and a byte of flags, 38 bytes a row. An
+    open-addressed table of int32 row numbers, at most half full, finds a
+    user's row, so with it a tracked user costs 46 to 54 bytes; a dict would
+    add ~100 bytes of key, value and entry. The three buckets refill together
+    from the one timestamp. A sweep every quarter of ADMISSION_IDLE_TIMEOUT
+    drops users idle that long, whose buckets are full again by then, by
+    compacting the rows and rebuilding the table.
+
+    LOCKOUT_FAILURES wrong verification codes in a row lock the user out of
+    new links and /verify for LOCKOUT_DURATION. Searches only answer to their
+    own bucket.
+    """
+
+    def __init__(self, rates: tuple = (SEARCH_RATE, LINK_RATE, VERIFY_RATE),
+                 bursts: tuple = (SEARCH_BURST, LINK_BURST, VERIFY_BURST),
+                 lockout_failures: int = LOCKOUT_FAILURES, lockout_duration: float = LOCKOUT_DURATION,
+                 idle_timeout: float = ADMISSION_IDLE_TIMEOUT):
+        self.rates = rates
+        self.bursts = bursts
+        self.full = array('f', bursts)
+        self.lockout_failures = min(lockout_failures, 255)
+        self.lockout_duration = lockout_duration
+        self.idle_timeout = idle_timeout
+        # Rows, one per tracked user
+        self.user_ids = array('q')
+        self.refilled_at = array('d')
+        self.locked_until = array('d')
+        self.tokens = array('f')  # KINDS per row
+        self.failures = array('B')
+        self.warned = array('B')  # bit per kind: the user was told about a refusal since last admitted
+        self._index(MIN_TABLE_BITS)
+        self.next_sweep = 0.0
+        self.admitted = [0] * KINDS
+        self.rejected = [0] * KINDS
+        self.lockouts = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _index(self, bits: int):
+        """Rebuild the table of rows with 2**bits buckets"""
+        self.shift = 64 - bits
+        self.mask = (1 << bits) - 1
+        self.table = array('i', [-1]) * (1 << bits)
+        for row, user_id in enumerate(self.user_ids):
+            self.table[self._probe(user_id)[1]] = row
+
+    def _probe(self, user_id: int) -> tuple:
+        """(row, bucket) of a user, or (-1, the empty bucket it would take)"""
+        table, user_ids, mask = self.table, self.user_ids, self.mask
+        bucket = (user_id * HASH_MULTIPLIER & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        while True:
+            row = table[bucket]
+            if row < 0 or user_ids[row] == user_id:
+                return row, bucket
+            bucket = (bucket + 1) & mask
+
+    def _row(self, user_id: int, now: float) -> int:
+        row, bucket = self._probe(user_id)
+        if row >= 0:
+            return row
+        row = len(self.user_ids)
+        self.user_ids.append(user_id)
+        self.refilled_at.append(now)
+        self.locked_until.append(0.0)
+        self.tokens.extend(self.full)
+        self.failures.append(0)
+        self.warned.append(0)
+        self.table[bucket] = row
+        if 2 * len(self.user_ids) > len(self.table):
+            self._index(64 - self.shift + 1)
+        return row
+
+    def admit(self, user_id: int, kind: int) -> float:
+        """Take a token of `kind` for the user: 0.0 if admitted, else seconds until a request would be"""
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.sweep(now)
+        row = self._row(user_id, now)
+
+        locked_for = self.locked_until[row] - now
+        if kind != SEARCH and locked_for > 0:
+            self.rejected[kind] += 1
+            return locked_for
+
+        tokens, base = self.tokens, row * KINDS
+        elapsed = now - self.refilled_at[row]
+        self.refilled_at[row] = now
+        for k in range(KINDS):
+            tokens[base + k] = min(self.bursts[k], tokens[base + k] + elapsed * self.rates[k])
+
+        if tokens[base + kind] >= 1:
+            tokens[base + kind] -= 1
+            self.warned[row] &= ~(1 << kind) & 0xFF
+            self.admitted[kind] += 1
+            return 0.0
+        self.rejected[kind] += 1
+        return (1 - tokens[base + kind]) / self.rates[kind]
+
+    def would_refuse(self, user_id: int, kind: int) -> bool:
+        """True if a request of `kind` would be refused and the user was already told; takes no token
+
+        Such a request gets no answer at all, so it can be dropped before it is queued.
+        """
+        row = self._probe(user_id)[0]
+        if row < 0 or not self.warned[row] & (1 << kind):
+            return False
+        now = time.monotonic()
+        if kind == SEARCH or self.locked_until[row] <= now:
+            tokens = self.tokens[row * KINDS + kind] + (now - self.refilled_at[row]) * self.rates[kind]
+            if tokens >= 1:
+                return False
+        self.rejected[kind] += 1
+        return True
+
+    def should_notify(self, user_id: int, kind: int) -> bool:
+        """True for the first refusal of `kind` since the user was last admitted; later ones go unanswered"""
+        row = self._probe(user_id)[0]
+        if row < 0 or self.warned[row] & (1 << kind):
+            return False
+        self.warned[row] |= 1 << kind
+        return True
+
+    def record_failure(self, user_id: int) -> bool:
+        """Count a wrong verification code; True if it locked the user out"""
+        now = time.monotonic()
+        row = self._row(user_id, now)
+        failures = self.failures[row] + 1
+        if failures < self.lockout_failures:
+            self.failures[row] = failures
+            return False
+        self.failures[row] = 0
+        self.locked_until[row] = now + self.lockout_duration
+        self.lockouts += 1
+        return True
+
+    def record_success(self, user_id: int):
+        row = self._probe(user_id)[0]
+        if row >= 0:
+            self.failures[row] = 0
+
+    def sweep(self, now: float = None) -> int:
+        """Drop users idle past idle_timeout and not locked out, compacting the rows"""
+        now = time.monotonic() if now is None else now
+        self.next_sweep = now + self.idle_timeout / 4
+        idle_since = now - self.idle_timeout
+        refilled_at, locked_until = self.refilled_at, self.locked_until
+        keep = [row for row in range(len(self.user_ids)) if refilled_at[row] > idle_since or locked_until[row] > now]
+        evicted = len(self.user_ids) - len(keep)
+        if not evicted:
+            return 0
+
+        tokens = self.tokens
+        self.user_ids = array('q', [self.user_ids[row] for row in keep])
+        self.refilled_at = array('d', [refilled_at[row] for row in keep])
+        self.locked_until = array('d', [locked_until[row] for row in keep])
+        self.tokens = array('f', [tokens[row * KINDS + k] for row in keep for k in range(KINDS)])
+        self.failures = array('B', [self.failures[row] for row in keep])
+        self.warned = array('B', [self.warned[row] for row in keep])
+        self._index(max(MIN_TABLE_BITS, (2 * len(keep)).bit_length()))
+        self.evicted += evicted
+        return evicted
+
+# Global instance
+admission = AdmissionControl()
+
+metrics.counter('admission_rejected_searches_total', 'Searches refused by the per-user rate limit',
+                lambda: admission.rejected[SEARCH])
+metrics.counter('admission_rejected_links_total', 'Verification links refused by the per-user rate limit or a lockout',
+                lambda: admission.rejected[LINK])
+metrics.counter('admission_rejected_verifies_total', '/verify attempts refused by the per-user rate limit or a lockout',
+                lambda: admission.rejected[VERIFY])
+metrics.counter('admission_lockouts_total', 'Users locked out after LOCKOUT_FAILURES wrong codes',
+                lambda: admission.lockouts)
+metrics.gauge('admission_tracked_users', 'Users with rate limit state', lambda: len(admission))
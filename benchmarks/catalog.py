@@ -0,0 +1,108 @@
+"""Synthetic catalogs for the benchmarks: book names shaped like the channel's, over a Zipf-distributed vocabulary"""
+import random
+import string
+from itertools import accumulate
+
+from search_engine import IndexedFile, tokenize
+
+SUBJECTS = (
+    "Physics Chemistry Mathematics Biology Calculus Algebra Geometry Trigonometry Statistics Economics "
+    "History Geography Polity English Grammar Accountancy Python Java Programming Data_Structures Algorithms "
+    "Machine_Learning Organic_Chemistry Inorganic_Chemistry Physical_Chemistry Mechanics Thermodynamics "
+    "Electricity Optics Modern_Physics Botany Zoology Anatomy Physiology Pharmacology Microbiology "
+    "Operating_Systems Computer_Networks Databases Linear_Algebra Probability Discrete_Mathematics"
+).split()
+
+AUTHORS = (
+    "HC_Verma RD_Sharma RS_Aggarwal SL_Arora DC_Pandey Irodov Cengage Arihant MTG Disha Resnick_Halliday "
+    "Morrison_Boyd JD_Lee OP_Tandon Cormen Knuth Sedgewick Lutz Zelle Bishop Goodfellow Strang Stewart "
+    "Apostol Spivak Guyton Robbins Katzung Tanenbaum Silberschatz Kurose Korth Navathe Laxmikanth "
+    "Spectrum Lucent Wren_Martin Ramesh_Singh Bipan_Chandra NCERT Pearson Oxford McGraw_Hill"
+).split()
+
+EXAMS = "JEE_Main JEE_Advanced NEET UPSC SSC_CGL GATE CBSE ICSE CAT Olympiad KVPY".split()
+
+TOPIC_WORDS = (
+    "introduction concepts fundamentals principles problems solutions objective questions practice "
+    "complete guide handbook notes textbook revision workbook theory applications advanced elementary "
+    "modern integrated comprehensive mastering essentials illustrated crash course chapterwise topicwise "
+    "previous year papers mock tests formulas"
+).split()
+
+TAGS = ("", "", "", "", "[@pdf_books]", "(www.freebooks.in)", "@StudyMaterials", "[Scanned]", "OCR")
+
+def _pick(rng: random.Random, words: list, cum_weights: list, k: int) -> list:
+    return [w.replace('_', ' ') for w in rng.choices(words, cum_weights=cum_weights, k=k)]
+
+def book_name(rng: random.Random, long_tail: list, cum_weights: list) -> str:
+    """A file name as uploaders write them: author, title, class or exam, edition and a tag"""
+    kind = rng.random()
+    if kind < 0.2:
+        words = ["NCERT", "Class", str(rng.randint(6, 12)), rng.choice(SUBJECTS).replace('_', ' ')]
+        if rng.random() < 0.5:
+            words += ["Part", str(rng.randint(1, 2))]
+    elif kind < 0.4:
+        words = [rng.choice(EXAMS).replace('_', ' '), rng.choice(SUBJECTS).replace('_', ' ')]
+        words += _pick(rng, TOPIC_WORDS, None, rng.randint(1, 3))
+        words.append(str(rng.randint(2005, 2025)))
+    else:
+        words = _pick(rng, TOPIC_WORDS, None, rng.randint(0, 2))
+        words.append(rng.choice(SUBJECTS).replace('_', ' '))
+        words += _pick(rng, long_tail, cum_weights, rng.randint(1, 4))
+        words.append(rng.choice(AUTHORS).replace('_', ' '))
+        if rng.random() < 0.4:
+            words += [f"{rng.randint(1, 12)}{'th' if rng.random() < 0.7 else 'nd'}", "Edition"]
+        if rng.random() < 0.2:
+            words += ["Vol", str(rng.randint(1, 3))]
+
+    separator = rng.choice(('_', '_', ' ', '.', '-'))
+    if rng.random() < 0.3:
+        words = [w.title() for w in words]
+    tag = rng.choice(TAGS)
+    name = separator.join(' '.join(words).split())
+    return f"{name} {tag}.pdf" if tag else f"{name}.pdf"
+
+def synthetic_files(count: int, seed: int = 1, vocabulary: int = 30000) -> list:
+    """`count` IndexedFile records with realistic book names and a long-tailed vocabulary"""
+    rng = random.Random(seed)
+    long_tail = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        for _ in range(vocabulary)
+    ]
+    # Cumulative, so each draw is a bisect rather than a pass over the whole vocabulary
+    weights = list(accumulate(1 / (rank + 1) for rank in range(len(long_tail))))
+    files = []
+    for i in range(count):
+        name = book_name(rng, long_tail, weights)
+        caption = None
+        if rng.random() < 0.3:
+            caption = 'by ' + rng.choice(AUTHORS).replace('_', ' ') + ' ' + ' '.join(
+                _pick(rng, long_tail, weights, rng.randint(1, 10))
+            )
+        files.append(IndexedFile(f"F{i}", name, rng.randint(1, 50) << 20, i + 1, caption))
+    return files
+
+def misspell(rng: random.Random, word: str) -> str:
+    """One random edit: the typos fuzzy matching exists for"""
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.random()
+    if edit < 0.4:
+        return word[:i] + word[i + 1:]
+    if edit < 0.7:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+def sample_queries(files: list, count: int, seed: int = 2, typo_rate: float = 0.0) -> list:
+    """Queries made of words from real file names, so most have results; some with a typo"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = [w for w in tokenize(rng.choice(files).file_name) if not w.isdigit()] or ['physics']
+        words = rng.sample(words, min(len(words), rng.randint(1, 3)))
+        if typo_rate and rng.random() < typo_rate:
+            j = rng.randrange(len(words))
+            words[j] = misspell(rng, words[j])
+        queries.append(' '.join(words))
+    return queries
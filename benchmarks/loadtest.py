@@ -0,0 +1,395 @@
+"""Load-test driver: replays user traffic against PDFSearchBot.run on local stand-ins.
+
+    python -m benchmarks.loadtest --users 2000 --ramp 30 --output load.json
+    python -m benchmarks.loadtest --users 500 --api-latency 0.05 --api-error-rate 0.01 \\
+        --shortener-latency 0.3 --shortener-error-rate 0.05 --chat-limit 1 --global-limit 30
+    python -m benchmarks.loadtest --users 500 --flooders 20 --flood-rate 20
+
+The bot runs as its own process with its real polling loop, pointed at a
+StubTelegram and a StubArolinks served by this driver, so neither Telegram nor
+arolinks.com is contacted and no real token is needed. Every simulated user
+searches, maybe turns a page, presses a verify_ button, reads the code from the
+short link it was given and sends /verify. A step's latency runs from the
+update being queued to the bot's answer that completes it. --flooders adds
+abusive users sending searches and guessed /verify codes as fast as
+--flood-rate for the whole run, beside the measured users.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+
+from stub_telegram import StubTelegram
+from stub_arolinks import StubArolinks
+from benchmarks.catalog import synthetic_files, sample_queries
+from benchmarks.report import percentiles, rate, environment, write_json
+
+STEPS = ('search', 'page', 'verify_button', 'verify_command')
+
+# Outcomes that are correct answers, not failures
+EXPECTED_OUTCOMES = frozenset({'ok', 'no_results', 'rejected', 'duplicate'})
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Flooding users get ids from here, apart from the measured ones
+FLOODER_IDS = 10 ** 9
+
+def classify(step: str, method: str, params: dict) -> str:
+    """Outcome of `step` if this Bot API call completes it, else None"""
+    text = params.get('text', '')
+    markup = params.get('reply_markup', '')
+    if step == 'search' and method in ('sendMessage', 'editMessageText'):
+        if 'verify_' in markup:
+            return 'ok'
+        if 'No results' in text:
+            return 'no_results'
+        if 'error occurred' in text:
+            return 'error'
+        if 'Too many searches' in text:
+            return 'rate_limited'
+    elif step == 'page' and method == 'editMessageText':
+        if 'verify_' in markup:
+            return 'ok'
+        if 'expired' in text:
+            return 'expired'
+    elif step == 'verify_button' and method == 'editMessageText':
+        if 'Verification Required' in text:
+            return 'ok'
+        if 'Error generating link' in text:
+            return 'shortener_error'
+        if 'Verification Error' in text or 'not found' in text or 'expired' in text:
+            return 'error'
+    elif step == 'verify_command':
+        if method in ('sendDocument', 'forwardMessage'):
+            return 'ok'
+        if method == 'editMessageText' and 'just sent' in text:
+            return 'duplicate'
+        if method == 'sendMessage':
+            if 'Invalid or expired' in text:
+                return 'rejected'
+            if 'File Unavailable' in text:
+                return 'unavailable'
+            if 'Download Error' in text or 'Verification failed' in text:
+                return 'error'
+            if 'Too many' in text:
+                return 'rate_limited'
+    return None
+
+def callback_buttons(params: dict, prefix: str) -> list:
+    markup = json.loads(params.get('reply_markup') or '{}')
+    return [
+        button['callback_data']
+        for row in markup.get('inline_keyboard', ())
+        for button in row
+        if button.get('callback_data', '').startswith(prefix)
+    ]
+
+class Traffic:
+    """Simulated users talking to the bot through the stub Bot API"""
+
+    def __init__(self, telegram: StubTelegram, short_link_base: str, args):
+        self.telegram = telegram
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.code_pattern = re.compile(re.escape(short_link_base) + r'/(\S+)')
+        self.update_id = 0
+        self.waiting = {}  # chat_id -> (step, future)
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.outcomes = defaultdict(Counter)  # step -> outcome -> count
+        self.completed = 0
+        self.flood_updates = 0
+        self.flood_answers = 0
+        telegram.observers.append(self.observe)
+
+    def observe(self, method: str, params: dict, result):
+        chat_id = str(params.get('chat_id'))
+        if chat_id.isdigit() and int(chat_id) >= FLOODER_IDS:
+            self.flood_answers += 1
+            return
+        entry = self.waiting.get(chat_id)
+        if entry is None or entry[1].done():
+            return
+        outcome = classify(entry[0], method, params)
+        if outcome is not None:
+            entry[1].set_result((outcome, params, result))
+
+    def _update(self, user_id: int, key: str, payload: dict) -> dict:
+        self.update_id += 1
+        return {'update_id': self.update_id, key: payload}
+
+    def message(self, user_id: int, text: str) -> dict:
+        message = {
+            'message_id': self.update_id + 1,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self._update(user_id, 'message', message)
+
+    def callback(self, user_id: int, message_id: int, data: str) -> dict:
+        return self._update(user_id, 'callback_query', {
+            'id': str(self.update_id + 1),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'results'
+            }
+        })
+
+    async def step(self, user_id: int, step: str, make_update) -> tuple:
+        """Send an update and wait for the answer that completes the step"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[str(user_id)] = (step, future)
+        started = time.monotonic()
+        self.telegram.add_updates([make_update()])
+        try:
+            outcome, params, result = await asyncio.wait_for(future, self.args.step_timeout)
+            self.latencies[step].append(time.monotonic() - started)
+        except asyncio.TimeoutError:
+            outcome, params, result = 'timeout', {}, None
+        finally:
+            del self.waiting[str(user_id)]
+        self.outcomes[step][outcome] += 1
+        return outcome, params, result
+
+    async def think(self):
+        if self.args.think:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+    async def user(self, user_id: int, query: str):
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp))
+
+        outcome, params, result = await self.step(user_id, 'search', lambda: self.message(user_id, query))
+        if outcome != 'ok':
+            return
+        message_id = int(params['message_id']) if 'message_id' in params else result['message_id']
+
+        pages = callback_buttons(params, 'page_')
+        if pages and self.rng.random() < self.args.page_rate:
+            await self.think()
+            outcome, params, _ = await self.step(
+                user_id, 'page', lambda: self.callback(user_id, message_id, pages[-1])
+            )
+            if outcome != 'ok':
+                return
+
+        await self.think()
+        choice = self.rng.choice(callback_buttons(params, 'verify_'))
+        outcome, params, _ = await self.step(
+            user_id, 'verify_button', lambda: self.callback(user_id, message_id, choice)
+        )
+        if outcome != 'ok':
+            return
+
+        # The code is what the verification page would show; here it ends the short link's alias
+        match = self.code_pattern.search(params.get('text', ''))
+        code = match.group(1).rsplit('_', 1)[-1] if match else 'NOCODE00'
+        if self.rng.random() < self.args.wrong_code_rate:
+            code = 'WRONG000'
+        await self.think()
+        outcome, _, _ = await self.step(user_id, 'verify_command', lambda: self.message(user_id, f"/verify {code}"))
+        if outcome == 'ok':
+            self.completed += 1
+
+    async def flood(self, users: int, rate: float, queries: list):
+        """Abusive users each sending a search or a guessed /verify code `rate` times a second, until cancelled"""
+        flooders = range(FLOODER_IDS, FLOODER_IDS + users)
+        while True:
+            updates = [
+                self.message(user_id, self.rng.choice(queries) if self.rng.random() < 0.5
+                             else f"/verify {self.rng.randrange(16 ** 8):08X}")
+                for user_id in flooders
+            ]
+            self.telegram.add_updates(updates)
+            self.flood_updates += len(updates)
+            await asyncio.sleep(1 / rate)
+
+    def report(self) -> dict:
+        steps = {}
+        for step in STEPS:
+            outcomes = self.outcomes[step]
+            total = sum(outcomes.values())
+            if not total:
+                continue
+            failures = sum(n for outcome, n in outcomes.items() if outcome not in EXPECTED_OUTCOMES)
+            steps[step] = {
+                'count': total,
+                'outcomes': dict(outcomes),
+                'error_rate': round(failures / total, 4),
+                'latency': percentiles(self.latencies[step])
+            }
+        return steps
+
+async def wait_for_bot(telegram: StubTelegram, process, timeout: float):
+    """Until the bot's first getUpdates, i.e. the catalog is loaded and polling started"""
+    deadline = time.monotonic() + timeout
+    while not telegram.calls['getUpdates']:
+        if process.returncode is not None:
+            raise RuntimeError(f"Bot exited with status {process.returncode} during startup")
+        if time.monotonic() > deadline:
+            raise RuntimeError("Bot did not start polling in time")
+        await asyncio.sleep(0.2)
+
+async def drive(args) -> dict:
+    telegram = StubTelegram(
+        latency=args.api_latency, chat_limit=args.chat_limit, global_limit=args.global_limit,
+        error_rate=args.api_error_rate, dead_rate=args.dead_rate
+    )
+    arolinks = StubArolinks(latency=args.shortener_latency, error_rate=args.shortener_error_rate)
+    telegram_runner, api_url = await telegram.start()
+    arolinks_runner, shortener_url = await arolinks.start()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pdfbot_load_')
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(
+        os.environ,
+        TELEGRAM_API_URL=api_url,
+        AROLINKS_API_URL=shortener_url,
+        DATABASE_PATH=os.path.join(workdir, 'catalog.db'),
+        INDEX_SNAPSHOT_PATH=os.path.join(workdir, 'search_index.bin'),
+        SESSION_DB_PATH=os.path.join(workdir, 'sessions.db'),
+        LINK_POOL_SIZE=str(args.link_pool),
+        SEARCH_WORKERS=str(args.search_workers),
+        TELEGRAM_GLOBAL_RATE=str(args.bot_global_rate),
+        EXTRA_BACKUP_CHANNEL_IDS=','.join(str(-1001 - n) for n in range(1, args.shards)),
+        UPDATE_MODE='polling'
+    )
+    log_path = os.path.join(workdir, 'bot.log')
+    with open(log_path, 'ab') as log:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'benchmarks.loadtest', '--serve-bot', '--files', str(args.files),
+            '--seed', str(args.seed), cwd=REPO_ROOT, env=env, stdout=log, stderr=log
+        )
+    try:
+        await wait_for_bot(telegram, process, args.startup_timeout)
+
+        traffic = Traffic(telegram, shortener_url.rsplit('/', 1)[0], args)
+        queries = sample_queries(synthetic_files(min(args.files, 20000), args.seed), args.users, args.seed + 1,
+                                 typo_rate=args.typo_rate)
+        calls_before = sum(telegram.calls.values())
+        started = time.monotonic()
+        flood = asyncio.create_task(traffic.flood(args.flooders, args.flood_rate, queries)) if args.flooders else None
+        await asyncio.gather(*(
+            traffic.user(user_id, query) for user_id, query in enumerate(queries, start=1000)
+        ))
+        elapsed = time.monotonic() - started
+        if flood is not None:
+            flood.cancel()
+        updates = traffic.update_id
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 30)
+            except asyncio.TimeoutError:
+                process.kill()
+        await telegram_runner.cleanup()
+        await arolinks_runner.cleanup()
+
+    return {
+        'environment': environment(),
+        'parameters': {k: v for k, v in vars(args).items() if k != 'serve_bot'},
+        'bot_log': log_path,
+        'duration_s': round(elapsed, 3),
+        'users': args.users,
+        'completed_downloads': traffic.completed,
+        'updates': updates,
+        'updates_per_s': rate(updates, elapsed),
+        'bot_api_calls_per_s': rate(sum(telegram.calls.values()) - calls_before, elapsed),
+        'steps': traffic.report(),
+        'flood': {'updates': traffic.flood_updates, 'answers': traffic.flood_answers},
+        'telegram': telegram.stats(),
+        'shortener': {'requests': arolinks.requests, 'injected_errors': arolinks.errors}
+    }
+
+def serve_bot(files: int, seed: int):
+    """Bot process: seed an empty catalog across the shards, then PDFSearchBot.run() as in production"""
+    import config
+    # Never a real bot: the stub Bot API accepts any token
+    config.BOT_TOKEN = '123456:loadtest'
+    config.BACKUP_CHANNEL_ID = config.BACKUP_CHANNEL_ID or '-1001'
+    from database import MODELS, PDFFile, shards, upsert_files
+    from bot import PDFSearchBot
+
+    records = synthetic_files(files, seed)
+    size = -(-len(records) // len(shards))
+    for shard in shards:
+        shard.db.connect(reuse_if_open=True)
+        with shard.bound():
+            shard.db.create_tables(MODELS)
+            empty = not PDFFile.select().exists()
+        if empty:
+            upsert_files(records[shard.number * size:(shard.number + 1) * size], shard)
+        shard.db.close()
+    PDFSearchBot().run()
+
+def print_summary(result: dict):
+    print(f"{result['users']} users in {result['duration_s']}s: {result['updates_per_s']} updates/s, "
+          f"{result['completed_downloads']} downloads")
+    for step, stats in result['steps'].items():
+        latency = stats['latency']
+        print(f"  {step:<15} n={stats['count']:<6} p50={latency.get('p50_ms', 0):>9.2f}ms "
+              f"p99={latency.get('p99_ms', 0):>9.2f}ms  errors={stats['error_rate']:.2%}  {stats['outcomes']}")
+    print(f"  telegram: {result['telegram']['calls']} floods={result['telegram']['flood_errors']} "
+          f"injected={result['telegram']['injected_errors']} dead={result['telegram']['dead_rejections']}")
+    print(f"  shortener: {result['shortener']}")
+    if result['flood']['updates']:
+        print(f"  flooders: {result['flood']['updates']} updates, {result['flood']['answers']} Bot API calls to them")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ramp', type=float, default=10.0, help='seconds over which users arrive')
+    parser.add_argument('--think', type=float, default=0.0, help='mean seconds a user pauses between steps')
+    parser.add_argument('--page-rate', type=float, default=0.5, help='fraction of users who turn a page')
+    parser.add_argument('--wrong-code-rate', type=float, default=0.05, help='fraction of /verify with a wrong code')
+    parser.add_argument('--typo-rate', type=float, default=0.1, help='fraction of searches with a typo')
+    parser.add_argument('--files', type=int, default=80000, help='catalog size seeded into an empty database')
+    parser.add_argument('--shards', type=int, default=1, help='storage channels the catalog is split across')
+    parser.add_argument('--link-pool', type=int, default=0, help='LINK_POOL_SIZE for the bot')
+    parser.add_argument('--search-workers', type=int, default=0, help='SEARCH_WORKERS for the bot')
+    parser.add_argument('--bot-global-rate', type=float, default=30,
+                        help="TELEGRAM_GLOBAL_RATE for the bot; Telegram's default limit is 30 messages/s")
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds added to every Bot API call')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='fraction of Bot API calls failing with 502')
+    parser.add_argument('--dead-rate', type=float, default=0.0,
+                        help='fraction of file_ids and of channel messages the Bot API rejects as gone')
+    parser.add_argument('--chat-limit', type=int, default=0, help='Bot API calls per chat per second before 429')
+    parser.add_argument('--global-limit', type=int, default=0, help='Bot API calls per second before 429')
+    parser.add_argument('--shortener-latency', type=float, default=0.0, help='seconds added to every shortener call')
+    parser.add_argument('--shortener-error-rate', type=float, default=0.0, help='fraction of shortener calls failing')
+    parser.add_argument('--flooders', type=int, default=0, help='abusive users flooding searches and /verify')
+    parser.add_argument('--flood-rate', type=float, default=10.0, help='updates per second from each flooder')
+    parser.add_argument('--step-timeout', type=float, default=30.0, help='seconds before a step counts as timed out')
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--workdir', help='directory for the catalog, snapshot and bot.log; reused if given')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="results file, '-' for stdout")
+    parser.add_argument('--serve-bot', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_bot:
+        serve_bot(args.files, args.seed)
+        return
+
+    result = asyncio.run(drive(args))
+    print_summary(result)
+    if args.output:
+        write_json(args.output, result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""End-to-end update benchmark: PDFSearchBot handlers on a stub Bot, without sockets to Telegram.
+
+    python -m benchmarks.pipeline_bench --files 80000 --users 500
+
+Updates are built as Bot API JSON and parsed with Update.de_json, so the whole
+path from update to Bot API request is measured: routing, handlers, search,
+rendering, the shortener (against a local StubArolinks) and request encoding.
+Each user searches, turns a page, opens a file, sends /verify and types an
+inline query. Latency is per update processed one at a time; throughput is
+each stage fed through the update queue and the concurrent update processor.
+"""
+import time
+import json
+import asyncio
+import logging
+import argparse
+from telegram import Update
+from telegram.ext import ExtBot
+
+from config import RESULTS_PER_PAGE
+from search_engine import search_index
+from result_store import result_store
+from link_shortener import shortener, verification_system
+from stub_telegram import StubTelegram, StubRequest
+from stub_arolinks import StubArolinks
+from bot import PDFSearchBot
+from benchmarks.search_bench import build_index
+from benchmarks.catalog import sample_queries
+from benchmarks.report import percentiles, rate
+
+STAGES = ('search', 'page', 'verify_button', 'verify_command', 'inline')
+
+class UpdateFactory:
+    """Bot API update payloads for synthetic users"""
+
+    def __init__(self):
+        self.update_id = 0
+        self.now = int(time.time())
+
+    def _next(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+
+    def message(self, user_id: int, text: str) -> dict:
+        update_id = self._next()
+        message = {
+            'message_id': update_id,
+            'date': self.now,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self.user(user_id),
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': update_id, 'message': message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id = self._next()
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id),
+            'from': self.user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': self.now,
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'results'
+            }
+        }}
+
+    def inline(self, user_id: int, query: str) -> dict:
+        update_id = self._next()
+        return {'update_id': update_id, 'inline_query': {
+            'id': str(update_id), 'from': self.user(user_id), 'query': query, 'offset': ''
+        }}
+
+class PipelineBench:
+    def __init__(self, users: int, queries: list, first_user: int = 1000):
+        self.users = list(range(first_user, first_user + users))
+        self.queries = {user_id: queries[i % len(queries)] for i, user_id in enumerate(self.users)}
+        self.factory = UpdateFactory()
+
+    def stage_updates(self, stage: str) -> list:
+        """Updates for one stage; later stages read the state the earlier ones left"""
+        updates = []
+        for user_id in self.users:
+            query = self.queries[user_id]
+            if stage == 'search':
+                updates.append(self.factory.message(user_id, query))
+            elif stage == 'inline':
+                updates.append(self.factory.inline(user_id, query[:max(2, len(query) - 2)]))
+            elif stage == 'verify_command':
+                session = verification_system.store.get(user_id)
+                code = session.verification_token if session is not None else 'NOCODE00'
+                updates.append(self.factory.message(user_id, f"/verify {code}"))
+            else:
+                result_set = result_store.find(query)
+                if result_set is None:
+                    continue
+                if stage == 'page':
+                    page = 1 if len(result_set) > RESULTS_PER_PAGE else 0
+                    updates.append(self.factory.callback(user_id, f"page_{result_set.set_id}_{page}"))
+                else:
+                    updates.append(self.factory.callback(user_id, f"verify_{result_set.set_id}_0"))
+        return updates
+
+    async def latency(self, application, stage: str) -> dict:
+        """Process a stage's updates one at a time"""
+        samples = []
+        for data in self.stage_updates(stage):
+            started = time.perf_counter()
+            await application.process_update(Update.de_json(data, application.bot))
+            samples.append(time.perf_counter() - started)
+        return percentiles(samples)
+
+    async def throughput(self, application, stage: str) -> dict:
+        """Feed a stage through the update queue and wait for it to drain"""
+        updates = [Update.de_json(data, application.bot) for data in self.stage_updates(stage)]
+        started = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        await application.update_queue.join()
+        elapsed = time.perf_counter() - started
+        return {'updates': len(updates), 'seconds': round(elapsed, 4), 'updates_per_s': rate(len(updates), elapsed)}
+
+async def run_async(files: int, users: int, seed: int, api_latency: float, shortener_latency: float) -> dict:
+    result = {'index': build_index(files, seed)}
+    queries = sample_queries(list(filter(None, search_index.docs)), users, seed + 1)
+
+    telegram_stub = StubTelegram(latency=api_latency)
+    arolinks = StubArolinks(latency=shortener_latency)
+    arolinks_runner, shortener.base_url = await arolinks.start()
+
+    bot = ExtBot('123:abc', request=StubRequest(telegram_stub), get_updates_request=StubRequest(telegram_stub))
+    pdf_bot = PDFSearchBot()
+    application = pdf_bot.build_application(bot)
+    try:
+        await application.initialize()
+        await pdf_bot.post_init(application)
+        errors = []
+
+        async def on_error(update, context):
+            errors.append(context.error)
+        application.add_error_handler(on_error)
+
+        # Latency: one update at a time, cold caches for the first user group
+        sequential = PipelineBench(users, queries, first_user=1000)
+        result['latency'] = {stage: await sequential.latency(application, stage) for stage in STAGES}
+
+        # Throughput: a second group of users through the queue and concurrent processor
+        concurrent = PipelineBench(users, queries, first_user=1000 + users)
+        await application.start()
+        result['throughput'] = {stage: await concurrent.throughput(application, stage) for stage in STAGES}
+        await application.stop()
+
+        result['errors'] = len(errors)
+        result['bot_api_calls'] = dict(telegram_stub.calls)
+        result['shortener_calls'] = arolinks.requests
+    finally:
+        await pdf_bot.post_shutdown(application)
+        await application.shutdown()
+        await arolinks_runner.cleanup()
+    return result
+
+def run(files: int = 80000, users: int = 500, seed: int = 1, api_latency: float = 0.0,
+        shortener_latency: float = 0.0) -> dict:
+    # Handlers log every request at INFO; that would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    return asyncio.run(run_async(files, users, seed, api_latency, shortener_latency))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=80000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds added to every Bot API call')
+    parser.add_argument('--shortener-latency', type=float, default=0.0, help='seconds added to every shortener call')
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.users, args.seed, args.api_latency, args.shortener_latency), indent=2))
+
+if __name__ == '__main__':
+    main()
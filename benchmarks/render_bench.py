@@ -0,0 +1,97 @@
+"""Micro-benchmark for result page rendering.
+
+    python -m benchmarks.render_bench
+
+Compares the old per-flip string building with render_results_page, cold
+(display lines and page built on first use) and warm (memoized page). A cold
+render is slower than the old one, escaping included; only repeat flips gain.
+"""
+import time
+import argparse
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import RESULTS_PER_PAGE, MAX_RESULTS
+from search_engine import search_index
+from result_store import result_store
+from rendering import render_results_page, page_cache
+from benchmarks.catalog import synthetic_files, sample_queries
+
+def legacy_render(result_set, page: int) -> tuple:
+    """show_results_page's rendering before the rendering module, kept for comparison"""
+    start_idx = page * RESULTS_PER_PAGE
+    end_idx = start_idx + RESULTS_PER_PAGE
+    page_results = result_store.records(result_set, start_idx, end_idx)
+    total_pages = (len(result_set) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
+    message_text = (
+        f"🔍 **Search Results for:** `{result_set.query}`\n"
+        f"📄 **Found {len(result_set)} files**\n"
+        f"📑 **Page {page + 1}/{total_pages}**\n\n"
+        f"💡 **Select a file to get verification link**\n\n"
+    )
+    for i, file_info in enumerate(page_results, start_idx + 1):
+        file_size_mb = file_info.file_size // (1024 * 1024) if file_info.file_size > 0 else 0
+        caption_preview = file_info.file_caption[:50] + "..." if file_info.file_caption and len(file_info.file_caption) > 50 else file_info.file_caption
+        caption_text = f" - {caption_preview}" if caption_preview else ""
+        message_text += f"**{i}. {file_info.file_name}** ({file_size_mb}MB){caption_text}\n\n"
+    keyboard = []
+    row = []
+    for i, file_info in enumerate(page_results):
+        row.append(InlineKeyboardButton(f"📥 {i+1}", callback_data=f"verify_{result_set.set_id}_{start_idx + i}"))
+        if len(row) == 2 or i == len(page_results) - 1:
+            keyboard.append(row)
+            row = []
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"page_{result_set.set_id}_{page-1}"))
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{result_set.set_id}_{page+1}"))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    keyboard.append([InlineKeyboardButton("❓ Help", callback_data="help_btn")])
+    return message_text, InlineKeyboardMarkup(keyboard)
+
+def time_flips(render, flips: list) -> float:
+    """Mean microseconds per page flip"""
+    started = time.perf_counter()
+    for result_set, page in flips:
+        render(result_set, page)
+    return (time.perf_counter() - started) / len(flips) * 1e6
+
+def run(files: int = 20000, queries: int = 200, rounds: int = 20) -> dict:
+    search_index.build(synthetic_files(files))
+    result_sets = []
+    for query in sample_queries(list(filter(None, search_index.docs)), queries):
+        results = search_index.search(query, MAX_RESULTS)
+        if results:
+            result_sets.append(result_store.put(query, results))
+    flips = [
+        (result_set, page)
+        for result_set in result_sets
+        for page in range((len(result_set) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE)
+    ]
+
+    legacy = time_flips(legacy_render, flips * rounds)
+    cold = time_flips(render_results_page, flips)
+    warm = time_flips(render_results_page, flips * rounds)
+    return {
+        'result_sets': len(result_sets),
+        'pages': len(flips),
+        'legacy_us': round(legacy, 2),
+        'cold_us': round(cold, 2),
+        'memoized_us': round(warm, 2),
+        'cold_vs_legacy': round(cold / legacy, 2),
+        'speedup': round(legacy / warm, 1),
+        'page_cache_kb': page_cache.bytes // 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    for name, value in run(args.files, args.queries, args.rounds).items():
+        print(f"{name:>12}: {value}")
+
+if __name__ == '__main__':
+    main()
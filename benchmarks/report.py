@@ -0,0 +1,57 @@
+"""Shared helpers for benchmark results: percentiles, environment metadata and JSON output"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+def percentiles(samples: list, points=(50, 90, 99, 99.9)) -> dict:
+    """Exact percentiles of `samples` (seconds) in milliseconds, plus mean and max"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f"p{p:g}_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 4)
+              for p in points}
+    result['mean_ms'] = round(sum(ordered) / len(ordered) * 1000, 4)
+    result['max_ms'] = round(ordered[-1] * 1000, 4)
+    result['n'] = len(ordered)
+    return result
+
+def rate(count: int, seconds: float) -> float:
+    """Operations per second"""
+    return round(count / seconds, 1) if seconds else None
+
+def git_revision() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=root, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment() -> dict:
+    """What a result was measured on, so runs from different versions and hosts can be told apart"""
+    import telegram
+    import peewee
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'python_telegram_bot': telegram.__version__,
+        'peewee': peewee.__version__,
+        'argv': sys.argv[1:]
+    }
+
+def write_json(path: str, results: dict):
+    """Write results to `path`, or stdout for '-'"""
+    text = json.dumps(results, indent=2, sort_keys=False)
+    if path == '-':
+        print(text)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
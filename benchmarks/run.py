@@ -0,0 +1,99 @@
+"""Run the benchmark suites and write their results as JSON.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --suites search --files 1000000 --output big.json
+    python -m benchmarks.run --compare before.json --output after.json
+
+Every result carries the git revision and environment it was measured on;
+--compare prints the timings that moved by more than --threshold against an
+earlier results file.
+"""
+import json
+import asyncio
+import argparse
+
+from benchmarks import search_bench, session_bench, pipeline_bench, render_bench
+from result_store import result_store
+from search_cache import search_cache
+from benchmarks.report import environment, write_json
+
+SUITES = ('search', 'sessions', 'pipeline', 'render')
+
+# Leaf names where a larger number is worse, and where it is better
+SLOWER_IS_WORSE = ('_ms', '_s', 'seconds', '_us')
+FASTER_IS_BETTER = ('_per_s', 'speedup')
+
+def run_suite(name: str, args) -> dict:
+    if name == 'search':
+        return search_bench.run(args.files, args.queries, args.seed, args.shards)
+    if name == 'sessions':
+        return session_bench.run(args.sessions, args.sqlite_max)
+    if name == 'pipeline':
+        return pipeline_bench.run(args.pipeline_files, args.users, args.seed)
+    return render_bench.run(min(args.files, 20000))
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def compare(before: dict, after: dict, threshold: float) -> list:
+    """(metric, before, after, change) for timings that got worse or better by more than `threshold`"""
+    old, new = flatten(before.get('suites', {})), flatten(after.get('suites', {}))
+    rows = []
+    for path, value in new.items():
+        previous = old.get(path)
+        if not previous or not value:
+            continue
+        leaf = path.rsplit('.', 1)[-1]
+        if leaf.endswith(FASTER_IS_BETTER):
+            change = previous / value - 1
+        elif leaf.endswith(SLOWER_IS_WORSE):
+            change = value / previous - 1
+        else:
+            continue
+        if abs(change) > threshold:
+            rows.append((path, previous, value, change))
+    return sorted(rows, key=lambda row: -row[3])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES), help='comma-separated subset of ' + ', '.join(SUITES))
+    parser.add_argument('--files', type=int, default=80000, help='catalog size for the search suite')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--shards', type=int, default=1, help='shards the search suite splits its catalog into')
+    parser.add_argument('--sessions', default='10000,100000,1000000', help='comma-separated session counts')
+    parser.add_argument('--sqlite-max', type=int, default=100000, help='largest session count run against SQLite')
+    parser.add_argument('--pipeline-files', type=int, default=80000, help='catalog size for the pipeline suite')
+    parser.add_argument('--users', type=int, default=500, help='users per pipeline stage')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='-', help="results file, '-' for stdout")
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change worth reporting')
+    args = parser.parse_args()
+    args.sessions = [int(n) for n in args.sessions.split(',')]
+
+    results = {'environment': environment(), 'parameters': vars(args).copy(), 'suites': {}}
+    for name in args.suites.split(','):
+        if name not in SUITES:
+            parser.error(f"unknown suite '{name}'")
+        # Suites rebuild the global index; result sets and cached rankings from the last one would be stale
+        result_store.clear()
+        asyncio.run(search_cache.clear())
+        results['suites'][name] = run_suite(name, args)
+    write_json(args.output, results)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            before = json.load(f)
+        print(f"Against {before.get('environment', {}).get('revision')} (+ is worse):")
+        for path, previous, value, change in compare(before, results, args.threshold):
+            print(f"  {change:+7.1%}  {path}: {previous:g} -> {value:g}")
+
+if __name__ == '__main__':
+    main()
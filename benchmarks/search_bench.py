@@ -0,0 +1,112 @@
+"""Search benchmark: index build time and search_files latency percentiles.
+
+    python -m benchmarks.search_bench --files 80000 --queries 2000
+    python -m benchmarks.search_bench --files 1000000 --shards 8
+
+Queries are sampled from the catalog's own names; the cold pass is the first
+time each query runs (impact cache filling), the warm pass repeats them. With
+--shards the catalog is split into that many contiguous shards, as channels
+filled one after another would be, and searched through a ShardedIndex.
+"""
+import time
+import json
+import random
+import argparse
+import resource
+
+from config import MAX_RESULTS
+from search_engine import SearchIndex, ShardedIndex, search_index
+from database import search_files, prefix_search_files
+from benchmarks.catalog import synthetic_files, sample_queries
+from benchmarks.report import percentiles, rate
+
+def time_queries(search, queries: list) -> list:
+    """Seconds per query, in query order"""
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query, MAX_RESULTS)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def build_index(files: int, seed: int = 1) -> dict:
+    """Build the global index over a synthetic catalog, returning build timings"""
+    records = synthetic_files(files, seed)
+    started = time.perf_counter()
+    search_index.build(records)
+    built = time.perf_counter()
+    search_index.matcher.rebuild(search_index.postings)
+    finished = time.perf_counter()
+    return {
+        'files': len(search_index),
+        'terms': len(search_index.postings),
+        'build_s': round(built - started, 3),
+        'build_files_per_s': rate(files, built - started),
+        'fuzzy_vocabulary_s': round(finished - built, 3)
+    }
+
+def build_shards(files: int, shards: int, seed: int = 1) -> tuple:
+    """A ShardedIndex over a synthetic catalog split into contiguous shards, and its build timings"""
+    records = synthetic_files(files, seed)
+    indexes = [search_index] + [SearchIndex(number) for number in range(1, shards)]
+    size = -(-len(records) // shards)
+    started = time.perf_counter()
+    for number, index in enumerate(indexes):
+        index.build(records[number * size:(number + 1) * size])
+    built = time.perf_counter()
+    for index in indexes:
+        index.matcher.rebuild(index.postings)
+    finished = time.perf_counter()
+    sharded = ShardedIndex(indexes)
+    return sharded, {
+        'files': len(sharded),
+        'shards': shards,
+        'terms': sum(len(index.postings) for index in indexes),
+        'build_s': round(built - started, 3),
+        'build_files_per_s': rate(files, built - started),
+        'fuzzy_vocabulary_s': round(finished - built, 3)
+    }
+
+def run(files: int = 80000, queries: int = 2000, seed: int = 1, shards: int = 1) -> dict:
+    if shards > 1:
+        sharded, result = build_shards(files, shards, seed)
+        docs = [record for index in sharded.indexes for record in index.docs if record is not None]
+        search, prefix_search = sharded.search, sharded.prefix_search
+    else:
+        result = build_index(files, seed)
+        docs = list(filter(None, search_index.docs))
+        search, prefix_search = search_files, prefix_search_files
+
+    exact = sample_queries(docs, queries, seed + 1)
+    cold = time_queries(search, exact)
+    warm = time_queries(search, exact)
+    typos = time_queries(search, sample_queries(docs, queries, seed + 2, typo_rate=1.0))
+
+    # Inline queries arrive as the user types: every prefix of at least two characters
+    rng = random.Random(seed + 3)
+    typed = [q[:rng.randint(2, len(q))] for q in exact if len(q) >= 2]
+    prefix = time_queries(prefix_search, typed)
+
+    hits = sum(1 for q in exact[:200] if search(q, MAX_RESULTS))
+    result.update({
+        'queries': len(exact),
+        'hit_rate': round(hits / min(len(exact), 200), 3),
+        'search_cold': percentiles(cold),
+        'search_warm': percentiles(warm),
+        'search_typo': percentiles(typos),
+        'prefix_search': percentiles(prefix),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=80000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--shards', type=int, default=1, help='split the catalog across this many shards')
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.queries, args.seed, args.shards), indent=2))
+
+if __name__ == '__main__':
+    main()
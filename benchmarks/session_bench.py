@@ -0,0 +1,98 @@
+"""Verification session benchmark: VerificationSystem throughput by store and session count.
+
+    python -m benchmarks.session_bench --sessions 10000,100000,1000000
+
+Each size creates that many sessions, checks wrong and right codes, and times
+the expiry sweep with every session live and with every session expired.
+SQLite sizes are capped by --sqlite-max since each write is a transaction.
+"""
+import os
+import time
+import json
+import random
+import argparse
+import asyncio
+import tempfile
+
+from config import VERIFICATION_TIMEOUT
+from session_store import VerificationSession, MemorySessionStore, SQLiteSessionStore, session_db
+from link_shortener import VerificationSystem
+from benchmarks.report import rate
+
+def file_data(i: int) -> dict:
+    return {
+        'file_id': f"F{i}",
+        'file_name': f"NCERT_Class_12_Physics_Part_{i}.pdf",
+        'file_size': 4 << 20,
+        'message_id': i + 1,
+        'file_caption': None
+    }
+
+async def timed(fn, count: int = None) -> dict:
+    started = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - started
+    if count is None:
+        return {'seconds': round(elapsed, 6)}
+    return {'seconds': round(elapsed, 4), 'ops_per_s': rate(count, elapsed)}
+
+async def run_store(make_store, sessions: int, seed: int = 1) -> dict:
+    store = make_store()
+    system = VerificationSystem(store)
+    rng = random.Random(seed)
+    tokens = [f"{rng.getrandbits(40):010X}"[:8] for _ in range(sessions)]
+    probes = rng.sample(range(sessions), min(sessions, 10000))
+
+    async def create():
+        for user_id, token in enumerate(tokens):
+            await system.create_verification_session(user_id, file_data(user_id), token)
+
+    async def wrong_codes():
+        for user_id in probes:
+            await system.get_verified_file(user_id, 'WRONG000')
+
+    async def verify():
+        for user_id, token in enumerate(tokens):
+            await system.get_verified_file(user_id, token)
+
+    result = {'create': await timed(create, sessions)}
+    result['sweep_live'] = await timed(system.cleanup_expired_sessions)
+    result['wrong_code'] = await timed(wrong_codes, len(probes))
+    result['verify'] = await timed(verify, sessions)
+    result['verified'] = sessions - len(store)
+
+    # Backdated sessions go into a fresh store: the memory store's expiry queue
+    # relies on creation order being expiry order
+    store = make_store()
+    system = VerificationSystem(store)
+    created_at = time.time() - VERIFICATION_TIMEOUT - 1
+    for user_id, token in enumerate(tokens):
+        store.put(VerificationSession(user_id, file_data(user_id), token, created_at))
+    result['sweep_expired'] = await timed(system.cleanup_expired_sessions, sessions)
+    result['left_after_sweep'] = len(store)
+    return result
+
+def run(sizes=(10000, 100000, 1000000), sqlite_max: int = 100000) -> dict:
+    results = {'memory': {}, 'sqlite': {}}
+    for sessions in sizes:
+        results['memory'][str(sessions)] = asyncio.run(run_store(MemorySessionStore, sessions))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for sessions in sizes:
+            if sessions > sqlite_max:
+                continue
+            path = os.path.join(tmp, f"sessions_{sessions}.db")
+            results['sqlite'][str(sessions)] = asyncio.run(run_store(lambda: SQLiteSessionStore(path), sessions))
+            session_db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='10000,100000,1000000', help='comma-separated session counts')
+    parser.add_argument('--sqlite-max', type=int, default=100000, help='largest count run against SQLite')
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sessions.split(',')]
+    print(json.dumps(run(sizes, args.sqlite_max), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Search worker benchmark: concurrent search throughput and event-loop lag, in the loop and in worker processes.
+
+    python -m benchmarks.worker_bench --files 200000 --workers 0,2,4
+
+Each round runs the same queries from --concurrency tasks at once, while a
+ticker measures how late the event loop wakes it every millisecond: that lag
+is what every other handler, /verify and file delivery included, waits on.
+Workers are forked after the index is built, as the bot forks them after
+loading the catalog. Throughput only grows with workers up to the cores the
+machine has.
+"""
+import time
+import json
+import asyncio
+import argparse
+
+from config import MAX_RESULTS
+from search_engine import search_index
+from search_workers import SearchWorkerPool, SearchUnavailable
+from benchmarks.search_bench import build_index
+from benchmarks.catalog import sample_queries
+from benchmarks.report import percentiles, rate
+
+TICK = 0.001
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        samples.append(max(0.0, loop.time() - expected))
+
+async def round_trip(pool: SearchWorkerPool, queries: list, concurrency: int) -> dict:
+    pending = iter(queries)
+    latencies = []
+    failed = 0
+
+    async def client():
+        nonlocal failed
+        for query in pending:
+            started = time.perf_counter()
+            try:
+                await pool.search(query, MAX_RESULTS)
+            except SearchUnavailable:
+                failed += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    stop, lag = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return {
+        'searches_per_s': rate(len(latencies), elapsed),
+        'failed': failed,
+        'latency': percentiles(latencies),
+        'loop_lag': percentiles(lag)
+    }
+
+def run(files: int = 200000, queries: int = 2000, workers=(0, 2), concurrency: int = 16, seed: int = 1) -> dict:
+    result = {'index': build_index(files, seed)}
+    sample = sample_queries(list(filter(None, search_index.docs)), queries, seed + 1)
+    for size in workers:
+        pool = SearchWorkerPool(size, timeout=30.0)
+        pool.start()
+        try:
+            result[f"workers_{size}"] = asyncio.run(round_trip(pool, sample, concurrency))
+        finally:
+            pool.stop()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--workers', default='0,2', help='comma-separated pool sizes; 0 searches in the loop')
+    parser.add_argument('--concurrency', type=int, default=16, help='searches in flight at once')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    workers = [int(n) for n in args.workers.split(',')]
+    print(json.dumps(run(args.files, args.queries, workers, args.concurrency, args.seed), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import html
 import logging
 import asyncio
 from telegram import (
@@ -8,13 +9,31 @@ from telegram import (
 )
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
-    CallbackQueryHandler, ContextTypes, filters
+    CallbackQueryHandler, InlineQueryHandler, ContextTypes, filters
 )
-from telegram.constants import ParseMode
+from telegram.constants import ParseMode, ChatType
 
-from config import BOT_TOKEN, BACKUP_CHANNEL_ID, MAX_RESULTS, RESULTS_PER_PAGE
-from database import init_database, search_files, get_total_files
+from config import (
+    BOT_TOKEN, BACKUP_CHANNEL_ID, ADMIN_USER_ID, MAX_RESULTS,
+    UPDATE_MODE, TELEGRAM_API_URL, UPDATE_WORKERS, SEARCH_LATENCY_BUDGET,
+    INLINE_CACHE_TIME, METRICS_PORT, MAX_DOWNLOAD_ATTEMPTS, LOCKOUT_DURATION
+)
+from database import shards, init_database, get_total_files
+from search_engine import clean_filename
+from ingest import catalog_ingestor
+from search_cache import search_cache
+from search_workers import search_pool, SearchUnavailable
+from result_store import result_store
+from rendering import (
+    render_results_page, render_inline_page, searching_text, no_results_text, SEARCH_ERROR_TEXT, RESULTS_PARSE_MODE
+)
 from link_shortener import shortener, verification_system
+from admission import admission, wait_text, SEARCH, LINK, VERIFY
+from delivery import delivery_engine, FileUnavailable, DUPLICATE
+from webhook import serve_webhook
+from update_processor import UserOrderedUpdateProcessor, UpdateQueue
+from outbound import OutboundScheduler, PRIORITY_COSMETIC
+from metrics import metrics, delivery_latency, failed_deliveries
 
 # Set up logging
 logging.basicConfig(
@@ -26,13 +45,13 @@ logger = logging.getLogger(__name__)
 class PDFSearchBot:
     def __init__(self):
         self.application = None
+        self.update_processor = None
+        self.outbound = None
+        self.metrics_runner = None
 
     def clean_filename(self, filename):
         """Clean filename for better search"""
-        import re
-        name = re.sub(r'\.pdf$', '', filename, flags=re.IGNORECASE)
-        name = re.sub(r'[._-]', ' ', name)
-        return name.lower().strip()
+        return clean_filename(filename)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send welcome message when user sends /start"""
@@ -99,136 +118,149 @@ Example: `mathematics` or `python programming`
             await update.message.reply_text("Please enter at least 2 characters for search.")
             return
 
-        # Show searching message
-        searching_msg = await update.message.reply_text(f"🔍 Searching for: `{query}`...", parse_mode=ParseMode.MARKDOWN)
+        # Refused before any search work; a flood gets one notice, not a reply per message
+        user_id = update.message.from_user.id
+        wait = admission.admit(user_id, SEARCH)
+        if wait:
+            if admission.should_notify(user_id, SEARCH):
+                await update.message.reply_text(f"⏳ Too many searches. Please wait {wait_text(wait)} and try again.")
+            return
+
+        # Fast path: answer with the results page directly. The placeholder is only
+        # sent when the search overruns its latency budget, and is then edited into the answer
+        search = asyncio.ensure_future(search_cache.search(query, MAX_RESULTS))
+        placeholder = None
 
         try:
-            # Search for files
-            results = list(search_files(query, MAX_RESULTS))
-            
+            done, _ = await asyncio.wait({search}, timeout=SEARCH_LATENCY_BUDGET)
+            if not done:
+                placeholder = await update.message.reply_text(searching_text(query), parse_mode=RESULTS_PARSE_MODE)
+            results = await search
+
             if not results:
-                await searching_msg.edit_text(
-                    f"❌ No results found for: `{query}`\n\n"
-                    f"💡 Try:\n• Different keywords\n• Partial book names\n• Author names",
-                    parse_mode=ParseMode.MARKDOWN
-                )
+                await self.reply_or_edit(update, placeholder, no_results_text(query))
                 return
 
-            # Store results in context for pagination
-            context.user_data['search_results'] = results
-            context.user_data['current_page'] = 0
-            context.user_data['search_query'] = query
+            # Store results server-side; callbacks carry only the set ID
+            result_set = result_store.put(query, results)
 
             # Show first page
-            await self.show_results_page(update, context, results, 0, query)
-            await searching_msg.delete()
+            message_text, reply_markup = render_results_page(result_set, 0)
+            await self.reply_or_edit(update, placeholder, message_text, reply_markup)
 
         except Exception as e:
             logger.error(f"Search error: {e}")
-            await searching_msg.edit_text("❌ An error occurred while searching. Please try again.")
+            await self.reply_or_edit(update, placeholder, SEARCH_ERROR_TEXT)
 
-    async def show_results_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                              results: list, page: int, query: str):
-        """Show a page of search results"""
-        start_idx = page * RESULTS_PER_PAGE
-        end_idx = start_idx + RESULTS_PER_PAGE
-        page_results = results[start_idx:end_idx]
-        
-        total_pages = (len(results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
-        
-        # Create message text
-        message_text = (
-            f"🔍 **Search Results for:** `{query}`\n"
-            f"📄 **Found {len(results)} files**\n"
-            f"📑 **Page {page + 1}/{total_pages}**\n\n"
-            f"💡 **Select a file to get verification link**\n\n"
+    async def reply_or_edit(self, update: Update, placeholder, text: str, reply_markup=None):
+        """Answer a message, reusing the placeholder if one was already sent"""
+        if placeholder is not None:
+            await placeholder.edit_text(text, reply_markup=reply_markup, parse_mode=RESULTS_PARSE_MODE)
+        else:
+            await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=RESULTS_PARSE_MODE)
+
+    @staticmethod
+    async def edit_progress(context: ContextTypes.DEFAULT_TYPE, message, text: str, inline_message_id: str = None):
+        """Edit a progress note at cosmetic priority; the Message shortcuts take no rate_limit_args"""
+        await context.bot.edit_message_text(
+            text,
+            chat_id=message.chat_id if message is not None else None,
+            message_id=message.message_id if message is not None else None,
+            inline_message_id=inline_message_id,
+            parse_mode=ParseMode.MARKDOWN,
+            rate_limit_args=PRIORITY_COSMETIC
         )
 
-        # Add file list for current page
-        for i, file_info in enumerate(page_results, start_idx + 1):
-            file_size_mb = file_info.file_size // (1024 * 1024) if file_info.file_size > 0 else 0
-            caption_preview = file_info.file_caption[:50] + "..." if file_info.file_caption and len(file_info.file_caption) > 50 else file_info.file_caption
-            caption_text = f" - {caption_preview}" if caption_preview else ""
-            
-            message_text += f"**{i}. {file_info.file_name}** ({file_size_mb}MB){caption_text}\n\n"
-
-        # Create keyboard
-        keyboard = []
-        
-        # File selection buttons (2 per row)
-        row = []
-        for i, file_info in enumerate(page_results):
-            idx = start_idx + i
-            button_text = f"📥 {i+1}"
-            row.append(InlineKeyboardButton(button_text, callback_data=f"verify_{idx}"))
-            
-            if len(row) == 2 or i == len(page_results) - 1:
-                keyboard.append(row)
-                row = []
-
-        # Navigation buttons
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"page_{page-1}"))
-        
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{page+1}"))
-        
-        if nav_buttons:
-            keyboard.append(nav_buttons)
-
-        # Always show help button
-        keyboard.append([InlineKeyboardButton("❓ Help", callback_data="help_btn")])
+    async def show_results_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
+                              result_set, page: int):
+        """Show a page of search results"""
+        message_text, reply_markup = render_results_page(result_set, page)
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 message_text,
                 reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                parse_mode=RESULTS_PARSE_MODE
             )
         else:
             await update.message.reply_text(
                 message_text,
                 reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+                parse_mode=RESULTS_PARSE_MODE
             )
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle inline keyboard callbacks"""
         query = update.callback_query
-        await query.answer()
-
         data = query.data
 
+        if data.startswith("verify_"):
+            # Each verify_ press may call the shortener; refuse with the callback answer itself
+            wait = admission.admit(query.from_user.id, LINK)
+            if wait:
+                await query.answer(f"⏳ Too many links requested. Try again in {wait_text(wait)}.", show_alert=True)
+                return
+
+        await query.answer()
+
         if data == "help_btn":
             await self.help_command(update, context)
             return
 
-        if data.startswith("page_"):
-            # Handle pagination
-            page = int(data.split("_")[1])
-            results = context.user_data.get('search_results', [])
-            search_query = context.user_data.get('search_query', '')
-            
-            await self.show_results_page(update, context, results, page, search_query)
+        if data.startswith("page_") or data.startswith("verify_"):
+            # Callback data is action_setid_number
+            parts = data.split("_")
+            result_set = result_store.get(parts[1]) if len(parts) == 3 else None
+            if result_set is None:
+                await query.edit_message_text("⌛ These search results have expired. Please search again.")
+                return
+
+            if parts[0] == "page":
+                await self.show_results_page(update, context, result_set, int(parts[2]))
+            else:
+                await self.start_verification_process(update, context, result_set, int(parts[2]))
+
+    async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Search as you type; answered from memory, paged with next_offset"""
+        inline_query = update.inline_query
+        query = inline_query.query.strip()
+        if len(query) < 2:
+            await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+            return
+
+        try:
+            offset = int(inline_query.offset or 0)
+        except ValueError:
+            offset = 0
+
+        # Later pages and repeated queries reuse the stored set instead of searching again
+        result_set = result_store.find(query, mode='inline')
+        if result_set is None:
+            if admission.admit(inline_query.from_user.id, SEARCH):
+                await inline_query.answer([], cache_time=0)
+                return
+            try:
+                results = await search_pool.prefix_search(query, MAX_RESULTS)
+            except SearchUnavailable as e:
+                logger.warning(f"Inline search dropped: {e}")
+                await inline_query.answer([], cache_time=0)
+                return
+            result_set = result_store.put(query, results, mode='inline')
 
-        elif data.startswith("verify_"):
-            # Handle file verification process
-            idx = int(data.split("_")[1])
-            await self.start_verification_process(update, context, idx)
+        articles, next_offset = render_inline_page(result_set, offset)
+        await inline_query.answer(articles, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
 
-    async def start_verification_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, idx: int):
+    async def start_verification_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                         result_set, idx: int):
         """Start the verification process for selected file"""
         query = update.callback_query
-        results = context.user_data.get('search_results', [])
+        records = result_store.records(result_set, idx, idx + 1)
         
-        if not results or idx >= len(results):
+        if not records or records[0] is None:
             await query.edit_message_text("❌ File not found. Please search again.")
             return
 
-        file_info = results[idx]
+        file_info = records[0]
         user_id = query.from_user.id
         
         # Prepare file data
@@ -237,17 +269,19 @@ Example: `mathematics` or `python programming`
             'file_name': file_info.file_name,
             'file_size': file_info.file_size,
             'message_id': file_info.message_id,
-            'file_caption': file_info.file_caption
+            'file_caption': file_info.file_caption,
+            'channel_id': shards[file_info.shard].channel_id
         }
         
         try:
             # Show generating link message
-            await query.edit_message_text(
+            await self.edit_progress(
+                context, query.message,
                 f"🔄 **Generating secure download link...**\n\n"
                 f"📚 **File:** `{file_info.file_name}`\n"
                 f"👤 **User:** {query.from_user.first_name}\n\n"
                 f"Please wait...",
-                parse_mode=ParseMode.MARKDOWN
+                inline_message_id=query.inline_message_id
             )
 
             # Create verified download link
@@ -263,7 +297,7 @@ Example: `mathematics` or `python programming`
                 return
 
             # Store verification session
-            verification_system.create_verification_session(
+            await verification_system.create_verification_session(
                 user_id=user_id,
                 file_data=file_data,
                 verification_token=verification_data['verification_token']
@@ -284,7 +318,7 @@ Example: `mathematics` or `python programming`
             )
 
             keyboard = [
-                [InlineKeyboardButton("🔄 Generate New Link", callback_data=f"verify_{idx}")],
+                [InlineKeyboardButton("🔄 Generate New Link", callback_data=f"verify_{result_set.set_id}_{idx}")],
                 [InlineKeyboardButton("❓ Help", callback_data="help_btn")],
                 [InlineKeyboardButton("🔍 New Search", switch_inline_query_current_chat="")]
             ]
@@ -317,25 +351,42 @@ Example: `mathematics` or `python programming`
         verification_code = context.args[0].upper().strip()
         user_id = update.message.from_user.id
 
-        try:
-            # Clean up expired sessions first
-            verification_system.cleanup_expired_sessions()
+        wait = admission.admit(user_id, VERIFY)
+        if wait:
+            if admission.should_notify(user_id, VERIFY):
+                await update.message.reply_text(
+                    f"⏳ **Too many verification attempts.**\n\n"
+                    f"Please wait {wait_text(wait)} before trying again.",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            return
 
-            # Verify the token
-            file_data = verification_system.get_verified_file(user_id, verification_code)
+        try:
+            # Verify the token (expired sessions are swept in the background)
+            file_data = await verification_system.get_verified_file(user_id, verification_code)
             
             if not file_data:
+                if admission.record_failure(user_id):
+                    await update.message.reply_text(
+                        f"🔒 **Too many wrong codes!**\n\n"
+                        f"Verification is blocked for {wait_text(LOCKOUT_DURATION)}.",
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+                    return
                 await update.message.reply_text(
                     "❌ **Invalid or expired verification code!**\n\n"
                     "Possible reasons:\n"
                     "• Code is incorrect\n"
                     "• Code has expired (5 minutes)\n"
-                    "• No active verification session\n\n"
+                    "• No active verification session\n"
+                    f"• {MAX_DOWNLOAD_ATTEMPTS} wrong codes cancel the link\n\n"
                     "Please generate a new verification link and try again.",
                     parse_mode=ParseMode.MARKDOWN
                 )
                 return
 
+            admission.record_success(user_id)
+
             # Send the file
             await self.send_verified_file(update, context, file_data)
 
@@ -358,24 +409,40 @@ Example: `mathematics` or `python programming`
                 parse_mode=ParseMode.MARKDOWN
             )
 
-            # Forward the file from backup channel
-            await context.bot.forward_message(
-                chat_id=update.message.chat_id,
-                from_chat_id=BACKUP_CHANNEL_ID,
-                message_id=file_data['message_id']
-            )
+            with delivery_latency.time():
+                method = await delivery_engine.deliver(
+                    context.bot, update.message.chat_id, update.effective_user.id, file_data
+                )
+
+            if method == DUPLICATE:
+                await self.edit_progress(
+                    context, preparing_msg,
+                    f"📚 **File:** `{file_data['file_name']}`\n\n"
+                    f"✅ This file was just sent to you, check the messages above."
+                )
+                return
 
             # Send success message
-            await preparing_msg.edit_text(
+            await self.edit_progress(
+                context, preparing_msg,
                 f"🎉 **Download Complete!**\n\n"
                 f"📚 **File:** `{file_data['file_name']}`\n"
                 f"✅ **Status:** Successfully delivered\n\n"
                 f"Thank you for using our service! 📖\n\n"
-                f"Want another book? Just type your search query!",
-                parse_mode=ParseMode.MARKDOWN
+                f"Want another book? Just type your search query!"
             )
 
+        except FileUnavailable as e:
+            failed_deliveries.inc()
+            logger.error(f"File unavailable: {e}")
+            await update.message.reply_text(
+                f"❌ **File Unavailable**\n\n"
+                f"`{file_data['file_name']}` has been removed from our storage.\n"
+                f"Please search again for another copy.",
+                parse_mode=ParseMode.MARKDOWN
+            )
         except Exception as e:
+            failed_deliveries.inc()
             logger.error(f"Error sending verified file: {e}")
             await update.message.reply_text(
                 f"❌ **Download Error**\n\n"
@@ -387,11 +454,13 @@ Example: `mathematics` or `python programming`
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show bot statistics"""
         total_files = get_total_files()
+        cache_stats = search_cache.stats()
         
         stats_text = f"""
 📊 **Bot Statistics**
 
 📁 Total Files: {total_files:,}
+⚡ Search Cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses ({cache_stats['hit_rate']:.0%})
 🔒 Verification: Arolinks.com
 ⏰ Session Timeout: 5 minutes
 💾 Storage: Cloud (Telegram)
@@ -407,6 +476,79 @@ Example: `mathematics` or `python programming`
         """
         await update.message.reply_text(stats_text, parse_mode=ParseMode.MARKDOWN)
 
+        if ADMIN_USER_ID and str(update.message.from_user.id) == str(ADMIN_USER_ID):
+            # Live metrics for the admin only; monospace keeps the columns aligned
+            rows = metrics.summary()
+            width = max(len(name) for name, _ in rows)
+            summary = '\n'.join(f"{name:<{width}}  {value}" for name, value in rows)
+            await update.message.reply_text(f"📈 Live metrics\n\n<pre>{html.escape(summary)}</pre>", parse_mode=ParseMode.HTML)
+
+    async def handle_channel_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Index new documents posted to a storage channel"""
+        message = update.channel_post
+        if not message or not message.document:
+            return
+
+        try:
+            record = catalog_ingestor.record_from_message(message)
+            if record is not None:
+                await catalog_ingestor.add(record)
+        except Exception as e:
+            logger.error(f"Channel ingest error: {e}")
+
+    async def post_init(self, application: Application):
+        """Warm up outbound resources and background tasks before updates arrive"""
+        verification_system.start()
+        shortener.start()
+        if METRICS_PORT:
+            self.metrics_runner = await metrics.start()
+
+    async def post_shutdown(self, application: Application):
+        """Persist pending catalog changes and close outbound sessions on shutdown"""
+        await verification_system.stop()
+        await catalog_ingestor.close()
+        search_pool.stop()
+        await shortener.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+
+    @staticmethod
+    def screen_update(update: Update) -> bool:
+        """True for a search or /verify its handler would refuse silently, so it need not be queued"""
+        message = update.message
+        if message is None or message.text is None or message.from_user is None \
+                or message.chat.type != ChatType.PRIVATE:
+            return False
+        # Only what the handlers check the rate limit for, after the replies they give first
+        words = message.text.split()
+        if words and words[0].split('@')[0] == '/verify':
+            return len(words) > 1 and admission.would_refuse(message.from_user.id, VERIFY)
+        if message.text.startswith('/') or len(message.text.strip()) < 2:
+            return False
+        return admission.would_refuse(message.from_user.id, SEARCH)
+
+    def register_metrics(self):
+        """Gauges read from the running application at scrape time"""
+        metrics.gauge('indexed_files', 'Files in the search index', get_total_files)
+        if len(shards) > 1:
+            for shard in shards:
+                metrics.gauge(f'indexed_files_shard_{shard.number}', f'Files stored in channel {shard.channel_id}',
+                              lambda index=shard.index: len(index))
+        metrics.gauge('result_sets', 'Live paginated result sets', lambda: len(result_store))
+        metrics.gauge('user_data_entries', 'Users with stored user_data', lambda: len(self.application.user_data))
+        metrics.gauge('updates_admitted', 'Updates queued or being handled, out of UPDATE_QUEUE_SIZE',
+                      lambda: self.update_processor.admitted)
+        metrics.counter('updates_dropped_total', 'Updates dropped for a user over USER_MAX_PENDING_UPDATES',
+                        lambda: self.update_processor.dropped)
+        metrics.counter('updates_screened_total', 'Searches and /verify refused by the rate limit before queueing',
+                        lambda: self.update_processor.screened)
+        metrics.counter('updates_superseded_total', 'Queued updates replaced by a newer one',
+                        lambda: self.update_processor.merged)
+        metrics.counter('telegram_flood_waits_total', 'Bot API calls answered with 429 RetryAfter',
+                        lambda: self.outbound.retried)
+        metrics.counter('telegram_edits_merged_total', 'Queued edits folded into a newer edit',
+                        lambda: self.outbound.merged)
+
     def run(self):
         """Start the bot"""
         if not BOT_TOKEN:
@@ -419,22 +561,63 @@ Example: `mathematics` or `python programming`
 
         # Initialize database
         init_database()
+        # Workers fork now, sharing the loaded catalog, before the event loop starts any threads
+        search_pool.start()
 
-        # Initialize application
-        self.application = Application.builder().token(BOT_TOKEN).build()
+        self.build_application()
+
+        # Start the bot
+        logger.info("Bot is starting...")
+        logger.info(f"Total files in database: {get_total_files()}")
+        if UPDATE_MODE == 'webhook':
+            asyncio.run(serve_webhook(self.application))
+        else:
+            self.application.run_polling()
+
+    def build_application(self, bot=None) -> Application:
+        """Create the application and register handlers; `bot` replaces the HTTP bot, e.g. in benchmarks"""
+        self.update_processor = UserOrderedUpdateProcessor(screen=self.screen_update)
+        builder = Application.builder()
+        if bot is None:
+            self.outbound = OutboundScheduler()
+            builder = (
+                builder.token(BOT_TOKEN)
+                .base_url(TELEGRAM_API_URL)
+                .connection_pool_size(UPDATE_WORKERS)
+                .rate_limiter(self.outbound)
+            )
+        else:
+            # A prebuilt bot brings its own transport and rate limiter
+            self.outbound = bot.rate_limiter if bot.rate_limiter is not None else OutboundScheduler()
+            builder = builder.bot(bot)
+        self.application = (
+            builder
+            .update_queue(UpdateQueue(self.update_processor))
+            .concurrent_updates(self.update_processor)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
+
+        self.register_metrics()
 
         # Add handlers
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("stats", self.stats_command))
         self.application.add_handler(CommandHandler("verify", self.verify_command))
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_search))
+        channel_ids = [int(shard.channel_id) for shard in shards if shard.channel_id]
+        if channel_ids:
+            self.application.add_handler(MessageHandler(
+                filters.UpdateType.CHANNEL_POST & filters.Chat(chat_id=channel_ids) & filters.Document.PDF,
+                self.handle_channel_post
+            ))
+        self.application.add_handler(MessageHandler(
+            filters.UpdateType.MESSAGE & filters.ChatType.PRIVATE & filters.TEXT & ~filters.COMMAND, self.handle_search
+        ))
         self.application.add_handler(CallbackQueryHandler(self.handle_callback))
-
-        # Start the bot
-        logger.info("Bot is starting...")
-        logger.info(f"Total files in database: {get_total_files()}")
-        self.application.run_polling()
+        self.application.add_handler(InlineQueryHandler(self.handle_inline_query))
+        return self.application
 
 if __name__ == '__main__':
     bot = PDFSearchBot()
@@ -0,0 +1,281 @@
+"""Bulk catalog import and export, streamed in constant memory.
+
+    python catalog_io.py import books.jsonl
+    python catalog_io.py import books.csv
+    python catalog_io.py import result.json          # Telegram Desktop channel export
+    python catalog_io.py import result.json --shard 1   # export of the second storage channel
+    python catalog_io.py export catalog.jsonl
+
+JSONL and CSV rows carry file_id, file_name, file_size, message_id and
+optionally file_caption and file_unique_id. A channel export has no Bot API
+file_ids, so its files get `export_<message_id>` ids; delivery forwards them
+by message_id until a forward reveals their real file_id. Rows repeating a
+file already in the catalog, by cleaned name and size, or earlier in the
+input, by that or by file_unique_id (the catalog doesn't store it), are
+skipped; rows with a known file_id update it if anything changed. Everything
+is written in one transaction and indexed in the same pass, and the index
+snapshot is saved so the bot starts without rebuilding. Each run reads or
+writes one shard, the catalog of one storage channel; duplicates are looked
+for in every shard. Run it while the bot is stopped, or restart the bot
+afterwards.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+
+from search_engine import IndexedFile, clean_filename
+from database import (
+    BULK_BATCH_SIZE, PLACEHOLDER_FILE_ID_PREFIX, Shard, shards, catalog, open_catalog, upsert_file_stream,
+    iter_files, save_snapshot
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 100000
+READ_CHUNK_SIZE = 1 << 20
+
+def read_jsonl(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_csv(path: str):
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+def iter_json_array(f, key: str):
+    """Elements of the array under `key` in a JSON document, decoded one at a time"""
+    decoder = json.JSONDecoder()
+    marker = f'"{key}"'
+    buffer = ''
+    while True:
+        found = buffer.find(marker)
+        if found >= 0:
+            buffer = buffer[found + len(marker):]
+            break
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        buffer = buffer[-len(marker):] + chunk
+
+    pos = 0
+    opened = False
+    while True:
+        # Skip the separators between elements, reading more when the buffer runs out
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,:':
+            pos += 1
+        if pos == len(buffer):
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer, pos = chunk, 0
+            continue
+        if not opened:
+            if buffer[pos] != '[':
+                raise ValueError(f"'{key}' is not an array")
+            opened = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Element continues past the buffer
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield element
+        pos = end
+
+def caption_text(text) -> str:
+    """Plain caption from an export's text field, which is a string or a list of entity parts"""
+    if isinstance(text, list):
+        return ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+    return text or ''
+
+def read_telegram_export(path: str):
+    """PDF documents in a Telegram Desktop channel export (result.json)"""
+    with open(path, encoding='utf-8') as f:
+        for message in iter_json_array(f, 'messages'):
+            if message.get('type') != 'message' or 'file' not in message:
+                continue
+            name = message.get('file_name') or os.path.basename(message['file'])
+            if message.get('mime_type') != 'application/pdf' and not name.lower().endswith('.pdf'):
+                continue
+            if name.startswith('('):
+                # "(File not included...)" when the export skipped the files themselves
+                name = f"file_{message['id']}.pdf"
+            yield {
+                'file_id': f"{PLACEHOLDER_FILE_ID_PREFIX}{message['id']}",
+                'file_name': name,
+                'file_size': message.get('file_size', 0),
+                'message_id': message['id'],
+                'file_caption': caption_text(message.get('text'))
+            }
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv, 'telegram': read_telegram_export}
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension == '.json':
+        return 'telegram'
+    return 'jsonl'
+
+def to_record(row: dict) -> IndexedFile:
+    """File record from an input row, or None if it lacks a usable id or name"""
+    try:
+        file_id = str(row['file_id']).strip()
+        file_name = ' '.join(str(row['file_name']).split())
+        message_id = int(row['message_id'])
+        file_size = int(row.get('file_size') or 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not file_id or not file_name:
+        return None
+    caption = (row.get('file_caption') or '').strip() or None
+    return IndexedFile(file_id, file_name, file_size, message_id, caption)
+
+def name_key(record: IndexedFile) -> int:
+    """Duplicate key from the name as search sees it, plus the size"""
+    return hash((' '.join(clean_filename(record.file_name).split()), record.file_size))
+
+class Importer:
+    """Filters rows into new or updated records for a shard, indexing each as it passes through"""
+
+    def __init__(self, shard: Shard):
+        self.index = shard.index
+        self.read = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.unique_ids = set()  # of this input only: the catalog has no file_unique_id column
+        # Only hashes are kept: a few dozen bytes per catalog file
+        self.names = {name_key(record) for index in catalog.indexes for record in index.docs if record is not None}
+
+    def records(self, rows):
+        for row in rows:
+            self.read += 1
+            if self.read % PROGRESS_EVERY == 0:
+                logger.info(f"Read {self.read:,} rows")
+
+            record = to_record(row)
+            if record is None:
+                self.invalid += 1
+                continue
+
+            key = name_key(record)
+            doc_id = self.index.doc_ids.get(record.file_id)
+            if doc_id is not None:
+                current = self.index.docs[doc_id]
+                if (current.file_name, current.file_size, current.message_id, current.file_caption) == \
+                        (record.file_name, record.file_size, record.message_id, record.file_caption):
+                    # Re-imports skip unchanged files: replacing a doc rewrites its posting lists
+                    self.unchanged += 1
+                    continue
+                self.updated += 1
+            else:
+                unique_id = row.get('file_unique_id')
+                unique_key = hash(unique_id) if unique_id else None
+                if unique_key in self.unique_ids or key in self.names:
+                    self.duplicates += 1
+                    continue
+                if unique_key is not None:
+                    self.unique_ids.add(unique_key)
+            self.names.add(key)
+
+            self.index.upsert(record)
+            yield record
+
+def get_shard(number: int) -> Shard:
+    if not 0 <= number < len(shards):
+        raise SystemExit(f"No shard {number}: {len(shards)} configured, see EXTRA_BACKUP_CHANNEL_IDS")
+    return shards[number]
+
+def import_catalog(path: str, fmt: str = None, batch_size: int = BULK_BATCH_SIZE, shard: int = 0) -> dict:
+    target = get_shard(shard)
+    started = time.perf_counter()
+    open_catalog()
+    existing = len(target.index)
+    importer = Importer(target)
+
+    rows = READERS[fmt or detect_format(path)](path)
+    written, version = upsert_file_stream(importer.records(rows), batch_size, target)
+    if written:
+        target.index.version = version
+        save_snapshot(version, target)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'read': importer.read,
+        'written': written,
+        'new': written - importer.updated,
+        'updated': importer.updated,
+        'unchanged': importer.unchanged,
+        'duplicates': importer.duplicates,
+        'invalid': importer.invalid,
+        'shard': shard,
+        'shard_files': len(target.index),
+        'shard_files_before': existing,
+        'catalog_files': len(catalog),
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(importer.read / elapsed) if elapsed else None
+    }
+
+def export_catalog(path: str, shard: int = 0) -> int:
+    """Write every file of a shard as JSONL, in import format; '-' writes to stdout"""
+    source = get_shard(shard)
+    source.db.connect(reuse_if_open=True)
+    out = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+    # One encoder: json.dumps with options builds a new one per call
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    count = 0
+    try:
+        for file_id, file_name, file_size, message_id, file_caption, added_at in iter_files(source):
+            out.write(encode({
+                'file_id': file_id,
+                'file_name': file_name,
+                'file_size': file_size,
+                'message_id': message_id,
+                'file_caption': file_caption,
+                'added_at': added_at
+            }))
+            out.write('\n')
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    importing = commands.add_parser('import', help='add files from JSONL, CSV or a channel export')
+    importing.add_argument('path')
+    importing.add_argument('--format', choices=sorted(READERS), help='default: from the file extension')
+    importing.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE, help='rows written per executemany')
+    importing.add_argument('--shard', type=int, default=0, help='shard of the storage channel the files are in')
+    exporting = commands.add_parser('export', help='write the catalog as JSONL')
+    exporting.add_argument('path', help="output file, '-' for stdout")
+    exporting.add_argument('--shard', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    if args.command == 'import':
+        print(json.dumps(import_catalog(args.path, args.format, args.batch_size, args.shard)))
+    else:
+        count = export_catalog(args.path, args.shard)
+        logger.info(f"Exported {count:,} files")
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,110 @@ ADMIN_USER_ID = os.getenv('8019639744')
 
 # Arolinks.com Configuration
 AROLINKS_API_KEY = os.getenv('AROLINKS_API_KEY', '5055b2359bd39f316c468acefd9553ebae5f3e6f')
-AROLINKS_API_URL = "https://arolinks.com/api"
+AROLINKS_API_URL = os.getenv('AROLINKS_API_URL', "https://arolinks.com/api")
+VERIFICATION_PAGE_URL = os.getenv('VERIFICATION_PAGE_URL', "https://t.me/share/url?url=")
+
+# Shortener HTTP client
+SHORTENER_TIMEOUT = 10  # seconds per request
+SHORTENER_CONNECT_TIMEOUT = 3
+SHORTENER_RETRIES = 2
+SHORTENER_BACKOFF = 0.25  # base seconds, doubled per retry with full jitter
+SHORTENER_CONCURRENCY = 20  # in-flight API calls
+SHORTENER_MAX_CONNECTIONS = 20
+LINK_POOL_SIZE = int(os.getenv('LINK_POOL_SIZE', '0'))  # pre-created verification links, 0 disables
+SHORT_LINK_CACHE_TTL = 240  # seconds a short link is reused for the same destination, below VERIFICATION_TIMEOUT
+SHORT_LINK_CACHE_SIZE = 50000
+
+# Shortener circuit breaker
+CIRCUIT_WINDOW = 30  # seconds of outcomes considered
+CIRCUIT_MIN_CALLS = 10  # outcomes needed before the breaker may open
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_RESET_TIMEOUT = 15  # seconds open before half-open probes
+CIRCUIT_HALF_OPEN_PROBES = 2
 
 # Bot Settings
 MAX_RESULTS = 50
 RESULTS_PER_PAGE = 10
 VERIFICATION_TIMEOUT = 300  # 5 minutes for verification
 MAX_DOWNLOAD_ATTEMPTS = 3
+
+# Per-User Admission Control
+SEARCH_RATE = 0.5  # searches per second a user sustains
+SEARCH_BURST = 6
+LINK_RATE = 1 / 20  # verification links per second
+LINK_BURST = 3
+VERIFY_RATE = 1 / 10  # /verify attempts per second
+VERIFY_BURST = 5
+LOCKOUT_FAILURES = 10  # wrong /verify codes in a row before links and /verify are refused
+LOCKOUT_DURATION = 900  # seconds
+ADMISSION_IDLE_TIMEOUT = 600  # seconds without requests before a user's state is dropped
+
+# File Delivery
+DELIVERY_DEDUPE_WINDOW = 120  # seconds a repeat request for a file a user just received is not resent
+DELIVERY_HEALTH_TTL = 6 * 3600  # seconds a dead file_id or channel message is not retried
+DELIVERY_HEALTH_SIZE = 100000  # files whose delivery health is remembered
+
+# Database Configuration
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'pdf_files.db')
+INDEX_SNAPSHOT_PATH = os.getenv('INDEX_SNAPSHOT_PATH', 'search_index.bin')
+INDEX_SNAPSHOT_INTERVAL = 300  # seconds between snapshot rewrites after ingestion
+INGEST_RETRY_MAX_DELAY = 60  # seconds between retries of a failed catalog write, doubling up to this
+
+# Catalog Shards
+# Storage channels besides BACKUP_CHANNEL_ID, comma separated. Each is a shard with its own database
+# and index snapshot, stored beside DATABASE_PATH and INDEX_SNAPSHOT_PATH with a _<n> suffix
+EXTRA_BACKUP_CHANNEL_IDS = [c.strip() for c in os.getenv('EXTRA_BACKUP_CHANNEL_IDS', '').split(',') if c.strip()]
+
+# Search Result Cache
+SEARCH_CACHE_SIZE = 10000  # cached queries kept in memory
+SEARCH_CACHE_TTL = 600  # seconds
+SEARCH_CACHE_REDIS_URL = os.getenv('SEARCH_CACHE_REDIS_URL')  # e.g. redis://127.0.0.1:6379/0
+
+# Search Result Sets (pagination)
+RESULT_SET_TTL = 3600  # seconds an unused result set stays pageable
+MAX_RESULT_SETS = 50000
+PAGE_CACHE_BYTES = 16 * 1024 * 1024  # rendered pages kept across all result sets
+
+# Verification Session Store
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')  # 'memory' or 'sqlite'
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+
+# Update Delivery
+UPDATE_MODE = os.getenv('UPDATE_MODE', 'polling')  # 'polling' or 'webhook'
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')  # point at stub_telegram.py for offline runs
+UPDATE_QUEUE_SIZE = 1000  # updates accepted but not yet fully handled
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public URL passed to setWebhook; unset when updates are replayed locally
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_MAX_CONNECTIONS = 40
+
+# Update Processing
+UPDATE_WORKERS = 32  # updates handled at once across all users
+USER_MAX_PENDING_UPDATES = 5  # updates per user queued or running before new ones are dropped
+
+# Outbound Telegram API Limits
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))  # requests per second across all chats
+TELEGRAM_GLOBAL_BURST = 5
+TELEGRAM_CHAT_RATE = 1.0  # messages per second to one private chat
+TELEGRAM_CHAT_BURST = 3
+TELEGRAM_GROUP_RATE = 20 / 60  # messages per second to one group or channel
+TELEGRAM_MAX_RETRIES = 3  # retries after RetryAfter before the error reaches the handler
+
+# Search Replies
+SEARCH_LATENCY_BUDGET = 0.3  # seconds a search may take before a "Searching" placeholder is sent
+
+# Search Workers
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '0'))  # processes searching off the event loop; 0 searches on it
+SEARCH_WORKER_DEPTH = 4  # requests sent to one worker at a time; further searches wait for a slot
+SEARCH_WORKER_TIMEOUT = 2.0  # seconds a search may take, waiting for a slot included
+
+# Metrics
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 disables the /metrics endpoint
+
+# Inline Mode
+INLINE_PAGE_SIZE = 20  # results per inline answer; Telegram allows up to 50
+INLINE_CACHE_TIME = 30  # seconds Telegram may reuse an answer for the same query text
+INLINE_DEBOUNCE = 0.15  # a user's inline query is dropped if a newer one arrives within this
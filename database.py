@@ -0,0 +1,229 @@
+import os
+import logging
+from datetime import datetime
+from peewee import (
+    SqliteDatabase, Model, CharField, IntegerField, TextField, DateTimeField, chunked
+)
+
+from config import DATABASE_PATH, INDEX_SNAPSHOT_PATH, BACKUP_CHANNEL_ID, EXTRA_BACKUP_CHANNEL_IDS
+from search_engine import IndexedFile, SearchIndex, ShardedIndex, search_index
+from index_snapshot import SnapshotError, load_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, kept under SQLite's bound-variable limit
+UPSERT_BATCH_SIZE = 100
+# Rows held in memory per write during bulk imports
+BULK_BATCH_SIZE = 5000
+# Files imported without a Bot API file_id, e.g. from a channel export, get this prefix
+PLACEHOLDER_FILE_ID_PREFIX = 'export_'
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -1024 * 16
+}
+
+# Shard 0; further shards get their own database at runtime
+db = SqliteDatabase(DATABASE_PATH, pragmas=PRAGMAS)
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+class PDFFile(BaseModel):
+    file_id = CharField(unique=True)
+    file_name = CharField(index=True)
+    file_size = IntegerField(default=0)
+    message_id = IntegerField()
+    file_caption = TextField(null=True)
+    added_at = DateTimeField(default=datetime.now)
+
+class CatalogMeta(BaseModel):
+    key = CharField(primary_key=True)
+    value = IntegerField(default=0)
+
+MODELS = [PDFFile, CatalogMeta]
+
+def shard_path(path: str, number: int) -> str:
+    """Shard 0 keeps the configured path; shard n adds _n before the extension"""
+    if not number:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}_{number}{extension}"
+
+class Shard:
+    """One storage channel with its own SQLite database, search index and index snapshot"""
+
+    def __init__(self, number: int, channel_id: str, database: SqliteDatabase, index: SearchIndex,
+                 snapshot_path: str):
+        self.number = number
+        self.channel_id = channel_id
+        self.db = database
+        self.index = index
+        self.snapshot_path = snapshot_path
+
+    def bound(self):
+        """Context in which the models use this shard's database
+
+        Binding is process-wide, so shard database work must not overlap: the
+        ingestor writes one batch at a time and the CLI tools are sequential.
+        """
+        return self.db.bind_ctx(MODELS)
+
+def create_shards() -> list:
+    shards = [Shard(0, BACKUP_CHANNEL_ID, db, search_index, INDEX_SNAPSHOT_PATH)]
+    for number, channel_id in enumerate(EXTRA_BACKUP_CHANNEL_IDS, 1):
+        shards.append(Shard(
+            number, channel_id,
+            SqliteDatabase(shard_path(DATABASE_PATH, number), pragmas=PRAGMAS),
+            SearchIndex(number),
+            shard_path(INDEX_SNAPSHOT_PATH, number)
+        ))
+    return shards
+
+def shard_for_channel(chat_id: int) -> Shard:
+    """Shard stored in a channel, or None"""
+    for shard in shards:
+        if shard.channel_id and int(shard.channel_id) == chat_id:
+            return shard
+    return None
+
+def get_catalog_version(shard: Shard = None) -> int:
+    """Counter bumped by every catalog write, used to validate index snapshots"""
+    with (shard or shards[0]).bound():
+        meta = CatalogMeta.get_or_none(CatalogMeta.key == 'catalog_version')
+        return meta.value if meta else 0
+
+def bump_catalog_version():
+    """Increment the catalog version; call inside the writing transaction, with its shard bound"""
+    CatalogMeta.insert(key='catalog_version', value=1).on_conflict(
+        conflict_target=[CatalogMeta.key],
+        update={CatalogMeta.value: CatalogMeta.value + 1}
+    ).execute()
+
+def init_database():
+    """Create tables and load every shard's search index, from the snapshot when it is current"""
+    open_catalog()
+
+    # Build the fuzzy vocabulary indexes now rather than on the first misspelled query
+    for shard in shards:
+        shard.index.matcher.rebuild(shard.index.postings)
+
+def open_catalog():
+    """Create tables and load the search indexes, without the fuzzy vocabulary indexes"""
+    for shard in shards:
+        open_shard(shard)
+    if len(shards) > 1:
+        logger.info(f"Catalog: {len(catalog)} files in {len(shards)} shards")
+
+def open_shard(shard: Shard):
+    shard.db.connect(reuse_if_open=True)
+    with shard.bound():
+        shard.db.create_tables(MODELS)
+
+        version = get_catalog_version(shard)
+        try:
+            load_snapshot(shard.index, shard.snapshot_path, version, PDFFile.select().count())
+        except SnapshotError as e:
+            logger.info(f"Rebuilding search index of shard {shard.number}: {e}")
+            query = PDFFile.select(
+                PDFFile.file_id, PDFFile.file_name, PDFFile.file_size,
+                PDFFile.message_id, PDFFile.file_caption
+            ).order_by(PDFFile.id).namedtuples()
+            shard.index.build(query.iterator())
+            save_snapshot(version, shard)
+
+    shard.index.version = version
+
+def save_snapshot(version: int = None, shard: Shard = None):
+    """Persist a shard's search index for fast startup"""
+    shard = shard or shards[0]
+    if version is None:
+        version = get_catalog_version(shard)
+    try:
+        write_snapshot(shard.index, shard.snapshot_path, version)
+    except OSError as e:
+        logger.error(f"Error writing search index snapshot: {e}")
+
+def upsert_files(files: list, shard: Shard = None) -> int:
+    """Insert or update file records in one transaction, returning the new catalog version"""
+    rows = [{
+        'file_id': f.file_id,
+        'file_name': f.file_name,
+        'file_size': f.file_size,
+        'message_id': f.message_id,
+        'file_caption': f.file_caption
+    } for f in files]
+
+    shard = shard or shards[0]
+    with shard.bound(), shard.db.atomic():
+        for batch in chunked(rows, UPSERT_BATCH_SIZE):
+            PDFFile.insert_many(batch).on_conflict(
+                conflict_target=[PDFFile.file_id],
+                preserve=[PDFFile.file_name, PDFFile.file_size, PDFFile.message_id, PDFFile.file_caption]
+            ).execute()
+        bump_catalog_version()
+        return get_catalog_version(shard)
+
+def upsert_file_stream(files, batch_size: int = BULK_BATCH_SIZE, shard: Shard = None) -> tuple:
+    """Write an iterable of file records in one transaction, a chunk at a time
+
+    Returns (rows written, new catalog version). Only one chunk is held in memory.
+    """
+    # The upsert is built by peewee once and run per chunk with executemany: generating
+    # insert_many SQL for every value costs far more than SQLite spends executing it
+    sql, _ = PDFFile.insert(
+        file_id='', file_name='', file_size=0, message_id=0, file_caption=None, added_at=None
+    ).on_conflict(
+        conflict_target=[PDFFile.file_id],
+        preserve=[PDFFile.file_name, PDFFile.file_size, PDFFile.message_id, PDFFile.file_caption]
+    ).sql()
+
+    shard = shard or shards[0]
+    written = 0
+    with shard.bound(), shard.db.atomic():
+        cursor = shard.db.cursor()
+        for batch in chunked(files, batch_size):
+            added_at = PDFFile.added_at.db_value(datetime.now())
+            cursor.executemany(sql, [
+                (f.file_id, f.file_name, f.file_size, f.message_id, f.file_caption, added_at) for f in batch
+            ])
+            written += len(batch)
+        if written:
+            bump_catalog_version()
+        return written, get_catalog_version(shard)
+
+def iter_files(shard: Shard = None):
+    """Every file row in insertion order as raw tuples, streamed from the cursor
+
+    added_at stays the stored string; converting a million timestamps would dominate an export.
+    """
+    sql, params = PDFFile.select(
+        PDFFile.file_id, PDFFile.file_name, PDFFile.file_size, PDFFile.message_id,
+        PDFFile.file_caption, PDFFile.added_at
+    ).order_by(PDFFile.id).sql()
+    return (shard or shards[0]).db.execute_sql(sql, params)
+
+def index_files(files: list, version: int, shard: Shard = None):
+    """Add file records to a shard's search index in place"""
+    index = (shard or shards[0]).index
+    for f in files:
+        index.upsert(IndexedFile.from_row(f))
+    index.version = version
+
+def search_files(query: str, limit: int) -> list:
+    """Search files by name and caption across every shard, best matches first"""
+    return catalog.search(query, limit)
+
+def prefix_search_files(query: str, limit: int) -> list:
+    """Search files for a query still being typed, completing its last word"""
+    return catalog.prefix_search(query, limit)
+
+def get_total_files() -> int:
+    """Total number of searchable files"""
+    return len(catalog)
+
+# Global instances
+shards = create_shards()
+catalog = ShardedIndex([shard.index for shard in shards])
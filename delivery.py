@@ -0,0 +1,180 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from telegram.error import BadRequest
+from telegram.constants import MessageLimit
+
+from config import BACKUP_CHANNEL_ID, DELIVERY_DEDUPE_WINDOW, DELIVERY_HEALTH_TTL, DELIVERY_HEALTH_SIZE
+from database import PLACEHOLDER_FILE_ID_PREFIX
+from metrics import metrics, send_document_latency, forward_latency
+
+logger = logging.getLogger(__name__)
+
+# How a delivery was made
+SENT = 'sent'
+FORWARDED = 'forwarded'
+DUPLICATE = 'duplicate'
+
+class FileUnavailable(Exception):
+    """Neither the file_id nor the storage channel message can deliver the file"""
+
+def is_recipient_error(error: BadRequest) -> bool:
+    """A BadRequest about the user's chat, which says nothing about the file"""
+    return 'chat not found' in str(error).lower()
+
+class FileHealth:
+    """What failed the last time a file was delivered, and a working file_id learned from a forward"""
+    __slots__ = ('file_id', 'file_id_dead_until', 'message_dead_until')
+
+    def __init__(self):
+        self.file_id = None
+        self.file_id_dead_until = 0.0
+        self.message_dead_until = 0.0
+
+    def useless(self, now: float) -> bool:
+        return self.file_id is None and self.file_id_dead_until <= now and self.message_dead_until <= now
+
+class DeliveryEngine:
+    """Delivers verified files: send_document by file_id first, a forward from the storage channel as the fallback.
+
+    A file_id or channel message that Telegram rejects is remembered as dead
+    for DELIVERY_HEALTH_TTL, so later deliveries of that file skip straight to
+    what still works instead of paying a failed round-trip each time. Only a
+    BadRequest counts against a file; RetryAfter is the scheduler's business
+    and never triggers the fallback, which would just spend another request
+    against the same limit. A user asking again for a file they received
+    within DELIVERY_DEDUPE_WINDOW, or that is still on its way, is not sent
+    a second copy.
+    """
+
+    def __init__(self, dedupe_window: float = DELIVERY_DEDUPE_WINDOW, health_ttl: float = DELIVERY_HEALTH_TTL,
+                 max_health: int = DELIVERY_HEALTH_SIZE):
+        self.dedupe_window = dedupe_window
+        self.health_ttl = health_ttl
+        self.max_health = max_health
+        self.health = OrderedDict()  # (channel_id, catalog file_id) -> FileHealth, least recently touched first
+        self.recent = OrderedDict()  # (user_id, file_id) -> delivered_at, oldest first
+        self.in_flight = {}  # (user_id, file_id) -> delivery task
+        self.sent = 0
+        self.forwarded = 0
+        self.deduplicated = 0
+        self.fallbacks = 0
+        self.unavailable = 0
+
+    def _health(self, key: tuple) -> FileHealth:
+        health = self.health.get(key)
+        if health is None:
+            health = self.health[key] = FileHealth()
+            while len(self.health) > self.max_health:
+                self.health.popitem(last=False)
+        else:
+            self.health.move_to_end(key)
+        return health
+
+    def dead_files(self) -> int:
+        """Files neither way can currently deliver"""
+        now = time.monotonic()
+        # A forward is only tried once the file_id is dead or a placeholder
+        return sum(1 for h in self.health.values() if h.file_id is None and h.message_dead_until > now)
+
+    def recently_delivered(self, key: tuple) -> bool:
+        now = time.monotonic()
+        while self.recent:
+            oldest_key, delivered_at = next(iter(self.recent.items()))
+            if delivered_at > now - self.dedupe_window:
+                break
+            del self.recent[oldest_key]
+        return key in self.recent
+
+    async def deliver(self, bot, chat_id: int, user_id: int, file_data: dict) -> str:
+        """Deliver a file to a chat; returns SENT, FORWARDED or DUPLICATE, raises FileUnavailable"""
+        key = (user_id, file_data['file_id'])
+        task = self.in_flight.get(key)
+        if task is None and self.recently_delivered(key):
+            self.deduplicated += 1
+            return DUPLICATE
+        if task is not None:
+            # The copy already on its way is the one the user gets
+            await asyncio.shield(task)
+            self.deduplicated += 1
+            return DUPLICATE
+
+        task = self.in_flight[key] = asyncio.ensure_future(self._deliver(bot, chat_id, file_data))
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        method = await asyncio.shield(task)
+        self.recent[key] = time.monotonic()
+        self.recent.move_to_end(key)
+        return method
+
+    async def _deliver(self, bot, chat_id: int, file_data: dict) -> str:
+        catalog_id = file_data['file_id']
+        # Sessions from before sharding carry no channel: they are all from the first one
+        channel_id = file_data.get('channel_id') or BACKUP_CHANNEL_ID
+        # The same file_id can be stored in several channels, each with its own message
+        health_key = (channel_id, catalog_id)
+        health = self.health.get(health_key)
+        now = time.monotonic()
+
+        file_id = health.file_id if health is not None and health.file_id else catalog_id
+        file_id_dead = health is not None and health.file_id is None and health.file_id_dead_until > now
+        if not file_id_dead and not file_id.startswith(PLACEHOLDER_FILE_ID_PREFIX):
+            try:
+                with send_document_latency.time():
+                    await bot.send_document(
+                        chat_id=chat_id,
+                        document=file_id,
+                        caption=(file_data.get('file_caption') or '')[:MessageLimit.CAPTION_LENGTH] or None
+                    )
+                self.sent += 1
+                return SENT
+            except BadRequest as e:
+                if is_recipient_error(e):
+                    raise
+                logger.warning(f"file_id of {file_data['file_name']} rejected, forwarding instead: {e}")
+                health = self._health(health_key)
+                health.file_id = None
+                health.file_id_dead_until = now + self.health_ttl
+                self.fallbacks += 1
+
+        if health is not None and health.message_dead_until > now:
+            self.unavailable += 1
+            raise FileUnavailable(f"{file_data['file_name']}: file_id and channel message are both dead")
+        try:
+            with forward_latency.time():
+                message = await bot.forward_message(
+                    chat_id=chat_id,
+                    from_chat_id=channel_id,
+                    message_id=file_data['message_id']
+                )
+        except BadRequest as e:
+            if is_recipient_error(e):
+                raise
+            logger.warning(f"Channel message {file_data['message_id']} of {file_data['file_name']} is gone: {e}")
+            self._health(health_key).message_dead_until = now + self.health_ttl
+            self.unavailable += 1
+            raise FileUnavailable(f"{file_data['file_name']}: channel message {file_data['message_id']} is dead") from e
+
+        document = getattr(message, 'document', None)
+        if document is not None and document.file_id != catalog_id:
+            # The forward carries a file_id this bot can send; use it next time
+            health = self._health(health_key)
+            health.file_id = document.file_id
+            health.file_id_dead_until = 0.0
+        elif health is not None and health.useless(now):
+            self.health.pop(health_key, None)
+        self.forwarded += 1
+        return FORWARDED
+
+# Global instance
+delivery_engine = DeliveryEngine()
+
+metrics.counter('deliveries_sent_total', 'Files sent by cached file_id', lambda: delivery_engine.sent)
+metrics.counter('deliveries_forwarded_total', 'Files forwarded from the backup channel', lambda: delivery_engine.forwarded)
+metrics.counter('deliveries_deduplicated_total', 'Repeat requests answered without resending',
+                lambda: delivery_engine.deduplicated)
+metrics.counter('delivery_fallbacks_total', 'Rejected file_ids that fell back to forwarding',
+                lambda: delivery_engine.fallbacks)
+metrics.counter('deliveries_unavailable_total', 'Deliveries with no working file_id or channel message',
+                lambda: delivery_engine.unavailable)
+metrics.gauge('dead_files', 'Files known to have no working file_id or channel message', delivery_engine.dead_files)
@@ -0,0 +1,151 @@
+import os
+import sys
+import mmap
+import struct
+import logging
+from array import array
+
+from search_engine import IndexedFile
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'PDFIDX01'
+SNAPSHOT_FORMAT = 1
+
+# magic, format, byte order, doc slots, terms, catalog version, live docs, total length
+_HEADER = struct.Struct('<8sIIQQQQQ')
+# (offset, length) of every section, in _SECTIONS order
+_SECTIONS = ('strings', 'file_sizes', 'message_ids', 'doc_lengths', 'vocab', 'term_offsets', 'postings', 'frequencies')
+_TABLE = struct.Struct('<' + 'QQ' * len(_SECTIONS))
+_BYTE_ORDER = 1 if sys.byteorder == 'little' else 2
+
+
+class SnapshotError(Exception):
+    """Snapshot is missing, corrupt or out of date"""
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_snapshot(index, path: str, catalog_version: int):
+    """Write the index to `path` atomically"""
+    strings = []
+    file_sizes = array('Q')
+    message_ids = array('q')
+    for record in index.docs:
+        if record is None:
+            # Replaced slot: keeps doc_ids stable, skipped on load
+            strings.append('\x00\x00')
+            file_sizes.append(0)
+            message_ids.append(0)
+        else:
+            strings.append(f"{record.file_id}\x00{record.file_name}\x00{record.file_caption or ''}")
+            file_sizes.append(record.file_size)
+            message_ids.append(record.message_id)
+
+    terms = sorted(index.postings)
+    term_offsets = array('Q', [0])
+    postings = array('I')
+    frequencies = array('H')
+    for term in terms:
+        postings.extend(index.postings[term])
+        frequencies.extend(index.frequencies[term])
+        term_offsets.append(len(postings))
+
+    sections = [
+        '\x00'.join(strings).encode('utf-8', 'surrogatepass'),
+        file_sizes.tobytes(),
+        message_ids.tobytes(),
+        index.doc_lengths.tobytes(),
+        '\n'.join(terms).encode('utf-8'),
+        term_offsets.tobytes(),
+        postings.tobytes(),
+        frequencies.tobytes()
+    ]
+
+    table = []
+    offset = _align(_HEADER.size + _TABLE.size)
+    for data in sections:
+        table.extend((offset, len(data)))
+        offset = _align(offset + len(data))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, _BYTE_ORDER, len(index.docs), len(terms),
+            catalog_version, len(index), index.total_length
+        ))
+        f.write(_TABLE.pack(*table))
+        for (start, _), data in zip(zip(table[::2], table[1::2]), sections):
+            f.seek(start)
+            f.write(data)
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    logger.info(f"Search index snapshot written: {len(index)} files, {len(terms)} terms")
+
+
+def load_snapshot(index, path: str, catalog_version: int, row_count: int):
+    """Load `path` into `index`, sharing posting lists with the page cache via mmap"""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot open snapshot: {e}")
+
+    if len(mapped) < _HEADER.size + _TABLE.size:
+        raise SnapshotError("Snapshot is truncated")
+
+    magic, fmt, byte_order, doc_slots, term_count, version, live_docs, total_length = \
+        _HEADER.unpack_from(mapped, 0)
+    if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT or byte_order != _BYTE_ORDER:
+        raise SnapshotError("Snapshot format mismatch")
+    if version != catalog_version or live_docs != row_count:
+        raise SnapshotError(f"Snapshot is stale (version {version}, {live_docs} files)")
+
+    table = _TABLE.unpack_from(mapped, _HEADER.size)
+    view = memoryview(mapped)
+    sections = {}
+    for name, start, length in zip(_SECTIONS, table[::2], table[1::2]):
+        if start + length > len(mapped):
+            raise SnapshotError(f"Snapshot section {name} is truncated")
+        sections[name] = view[start:start + length]
+
+    strings = bytes(sections['strings']).decode('utf-8', 'surrogatepass').split('\x00') if doc_slots else []
+    file_sizes = sections['file_sizes'].cast('Q')
+    message_ids = sections['message_ids'].cast('q')
+    if len(strings) != doc_slots * 3 or len(file_sizes) != doc_slots:
+        raise SnapshotError("Snapshot document table is inconsistent")
+
+    terms = bytes(sections['vocab']).decode('utf-8').split('\n') if term_count else []
+    term_offsets = sections['term_offsets'].cast('Q')
+    postings = sections['postings'].cast('I')
+    frequencies = sections['frequencies'].cast('H')
+    if len(terms) != term_count or len(term_offsets) != term_count + 1:
+        raise SnapshotError("Snapshot vocabulary is inconsistent")
+
+    index.clear()
+    docs = index.docs
+    doc_ids = index.doc_ids
+    for doc_id in range(doc_slots):
+        file_id, file_name, caption = strings[doc_id * 3:doc_id * 3 + 3]
+        if not file_id:
+            docs.append(None)
+            continue
+        docs.append(IndexedFile(
+            file_id, file_name, file_sizes[doc_id], message_ids[doc_id], caption or None, index.shard
+        ))
+        doc_ids[file_id] = doc_id
+
+    # Posting lists stay as read-only views into the mapping until a write copies them
+    for i, term in enumerate(terms):
+        start, end = term_offsets[i], term_offsets[i + 1]
+        index.postings[term] = postings[start:end]
+        index.frequencies[term] = frequencies[start:end]
+
+    index.doc_lengths = array('H', sections['doc_lengths'].cast('H'))
+    index.total_length = total_length
+    index.impact_basis = len(doc_ids)
+    logger.info(f"Search index snapshot loaded: {len(doc_ids)} files, {term_count} terms")
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+from config import INDEX_SNAPSHOT_INTERVAL, INGEST_RETRY_MAX_DELAY
+from database import shards, shard_for_channel, upsert_files, index_files, save_snapshot
+from search_engine import IndexedFile
+from search_workers import search_pool
+
+logger = logging.getLogger(__name__)
+
+class CatalogIngestor:
+    """Batches new storage-channel documents into their shard's database and search index"""
+
+    def __init__(self, flush_delay: float = 1.0, batch_size: int = 500):
+        self.flush_delay = flush_delay
+        self.batch_size = batch_size
+        self.pending = {}  # (shard, file_id) -> IndexedFile, later posts win
+        self._flush_task = None
+        self._failures = 0  # flushes in a row that left files queued
+        self._lock = asyncio.Lock()
+        self._snapshot_dirty = set()  # shard numbers
+        self._last_snapshot = 0.0
+
+    def record_from_message(self, message) -> IndexedFile:
+        """Build a file record from a channel post carrying a document, or None if no shard stores that channel"""
+        shard = shard_for_channel(message.chat_id)
+        if shard is None:
+            return None
+        document = message.document
+        return IndexedFile(
+            file_id=document.file_id,
+            file_name=document.file_name or f"file_{message.message_id}.pdf",
+            file_size=document.file_size or 0,
+            message_id=message.message_id,
+            file_caption=message.caption,
+            shard=shard.number
+        )
+
+    async def add(self, record: IndexedFile):
+        """Queue a file; it becomes searchable on the next flush"""
+        self.pending[(record.shard, record.file_id)] = record
+
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule_flush(self.flush_delay)
+
+    def _schedule_flush(self, delay: float):
+        """Flush after `delay` unless a flush is already scheduled"""
+        task = self._flush_task
+        if task is None or task.done() or task is asyncio.current_task():
+            self._flush_task = asyncio.create_task(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        """Write queued files in one transaction per shard, then index them"""
+        async with self._lock:
+            if not self.pending:
+                return
+            batches = {}
+            for record in self.pending.values():
+                batches.setdefault(record.shard, []).append(record)
+            self.pending = {}
+            failed = False
+
+            for number, batch in batches.items():
+                shard = shards[number]
+                try:
+                    # SQLite writes stay off the event loop, one at a time; the index is only touched from the loop
+                    version = await asyncio.to_thread(upsert_files, batch, shard)
+                except Exception as e:
+                    logger.error(f"Error ingesting {len(batch)} files into shard {number}: {e}")
+                    for record in batch:
+                        self.pending.setdefault((record.shard, record.file_id), record)
+                    failed = True
+                    continue
+
+                index_files(batch, version, shard)
+                search_pool.index_files(batch, version, number)
+                logger.info(f"Ingested {len(batch)} files from storage channel {shard.channel_id}")
+                self._snapshot_dirty.add(number)
+
+            # Failed batches are queued again and retried with backoff even if no new file arrives;
+            # files that came in meanwhile found this flush already scheduled
+            self._failures = self._failures + 1 if failed else 0
+            if self.pending:
+                self._schedule_flush(min(self.flush_delay * 2 ** self._failures, INGEST_RETRY_MAX_DELAY))
+
+            # The indexes only change under this lock, so snapshots can be written from a thread
+            now = asyncio.get_running_loop().time()
+            if self._snapshot_dirty and now - self._last_snapshot >= INDEX_SNAPSHOT_INTERVAL:
+                await self._save_snapshots()
+
+    async def _save_snapshots(self):
+        for number in sorted(self._snapshot_dirty):
+            await asyncio.to_thread(save_snapshot, None, shards[number])
+        self._snapshot_dirty.clear()
+        self._last_snapshot = asyncio.get_running_loop().time()
+
+    async def close(self):
+        """Flush queued files and persist the index before shutdown"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._flush_task and not self._flush_task.done():
+            # A retry the final flush scheduled; what it would write is lost either way
+            self._flush_task.cancel()
+        async with self._lock:
+            if self._snapshot_dirty:
+                await self._save_snapshots()
+
+# Global instance
+catalog_ingestor = CatalogIngestor()
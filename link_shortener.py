@@ -0,0 +1,373 @@
+import time
+import aiohttp
+import asyncio
+import logging
+from collections import deque, OrderedDict
+from config import (
+    AROLINKS_API_KEY, AROLINKS_API_URL, VERIFICATION_PAGE_URL,
+    SHORTENER_TIMEOUT, SHORTENER_CONNECT_TIMEOUT, SHORTENER_RETRIES, SHORTENER_BACKOFF,
+    SHORTENER_CONCURRENCY, SHORTENER_MAX_CONNECTIONS, LINK_POOL_SIZE,
+    SHORT_LINK_CACHE_TTL, SHORT_LINK_CACHE_SIZE, MAX_DOWNLOAD_ATTEMPTS,
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATE, CIRCUIT_RESET_TIMEOUT, CIRCUIT_HALF_OPEN_PROBES
+)
+from session_store import VerificationSession, SessionStore, create_session_store
+from metrics import metrics, shortener_latency, verify_latency
+import random
+import string
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ShortenerError(Exception):
+    """Retryable failure talking to the shortener API"""
+
+class CircuitBreaker:
+    """Fails fast while the recent failure rate of a dependency is too high"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: float = CIRCUIT_WINDOW, min_calls: int = CIRCUIT_MIN_CALLS,
+                 failure_rate: float = CIRCUIT_FAILURE_RATE, reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+                 half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.outcomes = deque()  # (timestamp, succeeded)
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_probes:
+                return False
+            self.probes += 1
+        return True
+
+    def record(self, succeeded: bool):
+        """Record the outcome of an allowed call"""
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            if succeeded:
+                logger.info("Shortener circuit closed")
+                self.state = self.CLOSED
+                self.outcomes.clear()
+                self.failures = 0
+            else:
+                self._open(now)
+            return
+
+        self.outcomes.append((now, succeeded))
+        if not succeeded:
+            self.failures += 1
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            if not self.outcomes.popleft()[1]:
+                self.failures -= 1
+
+        if (self.state == self.CLOSED and len(self.outcomes) >= self.min_calls
+                and self.failures / len(self.outcomes) >= self.failure_rate):
+            self._open(now)
+
+    def _open(self, now: float):
+        logger.warning("Shortener circuit opened")
+        self.state = self.OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+        self.failures = 0
+
+class ArolinksShortener:
+    def __init__(self, base_url: str = AROLINKS_API_URL, pool_size: int = LINK_POOL_SIZE):
+        self.api_key = AROLINKS_API_KEY
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.link_pool = []  # pre-created (verification_token, short_url) pairs
+        self.breaker = CircuitBreaker()
+        self.link_cache = OrderedDict()  # destination_url -> (expires_at, short url)
+        self.in_flight = {}  # (user_id, file_id) -> task creating that link
+        self._session = None
+        self._semaphore = None
+        self._refill_task = None
+
+    def generate_verification_token(self, length=8):
+        """Generate a random verification token"""
+        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Shared keep-alive session, created on first use inside the event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=SHORTENER_MAX_CONNECTIONS,
+                limit_per_host=SHORTENER_MAX_CONNECTIONS,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            timeout = aiohttp.ClientTimeout(total=SHORTENER_TIMEOUT, connect=SHORTENER_CONNECT_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._semaphore = asyncio.Semaphore(SHORTENER_CONCURRENCY)
+        return self._session
+
+    async def close(self):
+        """Close the shared session"""
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, params: dict) -> dict:
+        session = self.get_session()
+        async with self._semaphore:
+            with shortener_latency.time():
+                async with session.get(self.base_url, params=params) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise ShortenerError(f"API request failed with status: {response.status}")
+                    if response.status != 200:
+                        logger.error(f"API request failed with status: {response.status}")
+                        return {'status': 'error', 'message': 'API request failed'}
+                    return await response.json(content_type=None)
+
+    async def create_short_link(self, destination_url: str, custom_alias: str = None) -> dict:
+        """Create a short link using Arolinks.com API"""
+        params = {
+            'api': self.api_key,
+            'url': destination_url
+        }
+        
+        if custom_alias:
+            params['alias'] = custom_alias
+
+        # Destinations carry the verification token, so a cached link never outlives its token's session
+        now = time.monotonic()
+        cached = self.link_cache.get(destination_url)
+        if cached is not None:
+            if cached[0] > now:
+                return {'status': 'success', 'shortenedUrl': cached[1]}
+            del self.link_cache[destination_url]
+
+        if not self.breaker.allow():
+            return {'status': 'error', 'message': 'Link service is temporarily unavailable'}
+
+        # Recorded on every way out, cancellation included: a half-open probe that never
+        # reports back would keep the breaker refusing calls for good
+        succeeded = False
+        try:
+            for attempt in range(SHORTENER_RETRIES + 1):
+                try:
+                    result = await self._request(params)
+                    succeeded = result.get('status') == 'success'
+                    if succeeded:
+                        self._cache_link(destination_url, result['shortenedUrl'], now)
+                    return result
+                except (ShortenerError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == SHORTENER_RETRIES or self.breaker.state != CircuitBreaker.CLOSED:
+                        logger.error(f"Error creating short link: {e!r}")
+                        return {'status': 'error', 'message': str(e) or type(e).__name__}
+                    # Full jitter keeps retries from many users from arriving in lockstep
+                    await asyncio.sleep(random.uniform(0, SHORTENER_BACKOFF * 2 ** attempt))
+                except Exception as e:
+                    logger.error(f"Error creating short link: {e}")
+                    return {'status': 'error', 'message': str(e)}
+        finally:
+            self.breaker.record(succeeded)
+
+    def _cache_link(self, destination_url: str, short_url: str, now: float):
+        self.link_cache[destination_url] = (now + SHORT_LINK_CACHE_TTL, short_url)
+        while len(self.link_cache) > SHORT_LINK_CACHE_SIZE:
+            self.link_cache.popitem(last=False)
+
+    async def create_verification_link(self) -> tuple:
+        """Create a file-independent verification link, returning (token, short_url)"""
+        verification_token = self.generate_verification_token()
+        result = await self.create_short_link(
+            destination_url=f"{VERIFICATION_PAGE_URL}{verification_token}",
+            custom_alias=f"v_{verification_token}"
+        )
+        if result.get('status') == 'success':
+            return verification_token, result['shortenedUrl']
+        return None
+
+    async def fill_link_pool(self):
+        """Top the warm pool up to pool_size"""
+        while len(self.link_pool) < self.pool_size:
+            link = await self.create_verification_link()
+            if link is None:
+                # Shortener is failing; try again on the next hand-out
+                break
+            self.link_pool.append(link)
+
+    def start(self):
+        """Fill the warm pool in the background, so startup doesn't wait on the shortener"""
+        self._schedule_refill()
+
+    def _schedule_refill(self):
+        if self.pool_size and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self.fill_link_pool())
+
+    async def create_verified_download_link(self, file_data: dict, user_id: int) -> dict:
+        """Create a verified download link, sharing one in flight for the same user and file"""
+        key = (user_id, file_data['file_id'])
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.in_flight[key] = asyncio.ensure_future(self._create_verified_download_link(file_data, user_id))
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shield so one impatient caller cannot cancel the link others are waiting on
+        result = await asyncio.shield(task)
+        return dict(result, file_data=file_data)
+
+    async def _create_verified_download_link(self, file_data: dict, user_id: int) -> dict:
+        """Create a verified download link with token verification"""
+        
+        if self.link_pool:
+            # Pre-created link: no shortener round-trip on the user's click
+            verification_token, short_url = self.link_pool.pop()
+            self._schedule_refill()
+            return {
+                'status': 'success',
+                'short_url': short_url,
+                'verification_token': verification_token,
+                'file_data': file_data
+            }
+        self._schedule_refill()
+
+        # Generate verification token
+        verification_token = self.generate_verification_token()
+        
+        # Create a unique alias for the download link
+        file_alias = f"pdf_{user_id}_{file_data['file_id'][:8]}_{verification_token}"
+        
+        # Same token-carrying verification page as pooled links
+        result = await self.create_short_link(
+            destination_url=f"{VERIFICATION_PAGE_URL}{verification_token}",
+            custom_alias=file_alias
+        )
+        
+        if result.get('status') == 'success':
+            return {
+                'status': 'success',
+                'short_url': result['shortenedUrl'],
+                'verification_token': verification_token,
+                'file_data': file_data
+            }
+        else:
+            return result
+
+class VerificationSystem:
+    def __init__(self, store: SessionStore = None, sweep_interval: float = 1.0):
+        self.store = store if store is not None else create_session_store()
+        self.sweep_interval = sweep_interval
+        self.expired_count = 0
+        self.exhausted_count = 0
+        self.pending = 0  # live sessions as of the last sweep; counting the store may block
+        self._sweeper = None
+
+    async def _call(self, method, *args):
+        """Run store calls in a thread when the store blocks, so a locked database never stalls the loop"""
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def create_verification_session(self, user_id: int, file_data: dict, verification_token: str):
+        """Create a new verification session"""
+        session = VerificationSession(user_id, file_data, verification_token, time.time())
+        await self._call(self.store.put, session)
+        return session
+
+    async def verify_token(self, user_id: int, token: str) -> bool:
+        """Check a token without consuming the session"""
+        session = await self._call(self.store.get, user_id)
+        if session is not None and token.upper() == session.verification_token:
+            return True
+        if session is not None:
+            self._exhausted(await self._call(self._record_failed_attempt, user_id))
+        return False
+
+    def _record_failed_attempt(self, user_id: int) -> VerificationSession:
+        """Count a wrong code; the session is cancelled after MAX_DOWNLOAD_ATTEMPTS so codes can't be guessed.
+        Returns the cancelled session, if any"""
+        if self.store.record_attempt(user_id) < MAX_DOWNLOAD_ATTEMPTS:
+            return None
+        session = self.store.get(user_id)
+        self.store.remove(user_id)
+        return session
+
+    def _exhausted(self, session: VerificationSession):
+        if session is not None:
+            self.exhausted_count += 1
+
+    def is_session_valid(self, session: VerificationSession) -> bool:
+        """Check if verification session is still valid"""
+        return time.time() < session.expires_at
+
+    def _consume(self, user_id: int, token: str) -> tuple:
+        """(file_data, None) for a matching token, else (None, the session a wrong code cancelled)"""
+        file_data = self.store.consume(user_id, token)
+        if file_data is not None:
+            return file_data, None
+        return None, self._record_failed_attempt(user_id)
+
+    async def get_verified_file(self, user_id: int, token: str) -> dict:
+        """Consume the session if the token matches; at most one caller ever gets the file"""
+        with verify_latency.time():
+            file_data, exhausted = await self._call(self._consume, user_id, token.upper())
+        self._exhausted(exhausted)
+        return file_data
+
+    async def cleanup_session(self, user_id: int):
+        """Clean up verification session"""
+        await self._call(self.store.remove, user_id)
+
+    def _sweep(self) -> tuple:
+        """(sessions expired, live sessions left)"""
+        return self.store.expire(), len(self.store)
+
+    async def cleanup_expired_sessions(self) -> int:
+        """Drop sessions whose timeout has passed"""
+        expired, self.pending = await self._call(self._sweep)
+        self.expired_count += expired
+        return expired
+
+    async def run_sweeper(self):
+        """Expire sessions in the background"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.cleanup_expired_sessions()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def start(self):
+        """Start the background sweeper in the running loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self.run_sweeper())
+
+    async def stop(self):
+        """Stop the background sweeper"""
+        if self._sweeper and not self._sweeper.done():
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+        self._sweeper = None
+
+# Global instances
+shortener = ArolinksShortener()
+verification_system = VerificationSystem()
+
+metrics.gauge('pending_verifications', 'Live verification sessions at the last sweep', lambda: verification_system.pending)
+metrics.counter('expired_sessions_total', 'Verification sessions that timed out', lambda: verification_system.expired_count)
+metrics.counter('exhausted_sessions_total', 'Verification sessions cancelled after MAX_DOWNLOAD_ATTEMPTS wrong codes',
+                lambda: verification_system.exhausted_count)
+metrics.gauge('shortener_circuit_open', '1 while the shortener circuit breaker is open',
+              lambda: int(shortener.breaker.state != CircuitBreaker.CLOSED))
@@ -0,0 +1,171 @@
+import time
+import logging
+from bisect import bisect_left
+from aiohttp import web
+
+from config import METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached search (~10us) to a slow shortener call
+LATENCY_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+class Histogram:
+    """Latency histogram with fixed buckets; observe() is a bisect and two adds"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def time(self):
+        """Context manager observing the time spent in its block"""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self) -> list:
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{self.name}_sum {self.sum:.6f}')
+        lines.append(f'{self.name}_count {self.count}')
+        return lines
+
+    def summary(self) -> str:
+        if not self.count:
+            return "no samples"
+        mean = self.sum / self.count * 1000
+        return (
+            f"n={self.count:,} mean={mean:.2f}ms "
+            f"p50<={self.quantile(0.5) * 1000:g}ms p99<={self.quantile(0.99) * 1000:g}ms"
+        )
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+class Counter:
+    """Monotonic count, incremented in place or read from `fn` at scrape time"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, fn=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def read(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self) -> list:
+        return [f'{self.name} {self.read()}']
+
+    def summary(self) -> str:
+        return f"{self.read():,}"
+
+class Gauge(Counter):
+    """Current value read from `fn` at scrape time, so it costs nothing between scrapes"""
+    kind = 'gauge'
+
+class Registry:
+    def __init__(self, prefix: str = 'pdfbot_'):
+        self.prefix = prefix
+        self.metrics = {}  # short name -> metric
+
+    def _add(self, metric):
+        self.metrics[metric.name[len(self.prefix):]] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help_text, buckets))
+
+    def counter(self, name: str, help_text: str, fn=None) -> Counter:
+        return self._add(Counter(self.prefix + name, help_text, fn))
+
+    def gauge(self, name: str, help_text: str, fn) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help_text, fn))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                logger.error(f"Metric {metric.name} failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> list:
+        """(name, text) pairs for the admin /stats view"""
+        rows = []
+        for name, metric in self.metrics.items():
+            try:
+                rows.append((name, metric.summary()))
+            except Exception as e:
+                rows.append((name, f"error: {e}"))
+        return rows
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self, host: str = METRICS_LISTEN, port: int = METRICS_PORT) -> web.AppRunner:
+        """Serve GET /metrics in the running loop"""
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Metrics on http://{host}:{port}/metrics")
+        return runner
+
+# Global instance and the hot-path metrics; gauges and derived counters are registered by their owners
+metrics = Registry()
+
+search_latency = metrics.histogram('search_seconds', 'Index search time on a result cache miss')
+render_latency = metrics.histogram('render_seconds', 'Result page rendering time')
+shortener_latency = metrics.histogram('shortener_request_seconds', 'Shortener API request time')
+verify_latency = metrics.histogram('verify_seconds', 'Verification code check time')
+delivery_latency = metrics.histogram('delivery_seconds', 'Time to deliver a verified file')
+send_document_latency = metrics.histogram('delivery_send_document_seconds', 'sendDocument by cached file_id')
+forward_latency = metrics.histogram('delivery_forward_seconds', 'forwardMessage from the backup channel')
+failed_deliveries = metrics.counter('failed_deliveries_total', 'Verified files that could not be delivered')
@@ -0,0 +1,221 @@
+import time
+import heapq
+import asyncio
+import logging
+from itertools import count
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_RATE, TELEGRAM_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Lower is sooner: a file the user waited for beats a cosmetic edit
+PRIORITY_DELIVERY = 0
+PRIORITY_REPLY = 1
+PRIORITY_COSMETIC = 2
+
+# Edits are answers by default (a results page, a verification link); progress
+# notes pass rate_limit_args=PRIORITY_COSMETIC
+ENDPOINT_PRIORITIES = {
+    'sendDocument': PRIORITY_DELIVERY,
+    'forwardMessage': PRIORITY_DELIVERY,
+    'copyMessage': PRIORITY_DELIVERY,
+    'deleteMessage': PRIORITY_COSMETIC,
+    'sendChatAction': PRIORITY_COSMETIC
+}
+
+# Calls that don't count against message flood limits
+UNLIMITED_ENDPOINTS = frozenset({
+    'getMe', 'getFile', 'getChat', 'setWebhook', 'deleteWebhook', 'answerCallbackQuery', 'answerInlineQuery'
+})
+
+# Edits whose queued requests can be replaced by a newer edit of the same message
+MERGEABLE_ENDPOINTS = frozenset({'editMessageText', 'editMessageReplyMarkup'})
+
+MAX_CHAT_BUCKETS = 10000
+
+class TokenBucket:
+    """Token bucket whose waiters are served by priority, then arrival order"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters = []  # heap of (priority, seq, future)
+        self.seq = count()
+        self._timer = None
+
+    def _refill(self, now: float):
+        if now < self.blocked_until:
+            self.updated_at = now
+            return
+        self.tokens = min(self.burst, self.tokens + (now - max(self.updated_at, self.blocked_until)) * self.rate)
+        self.updated_at = now
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return not self.waiters and self.tokens >= self.burst
+
+    async def acquire(self, priority: int = PRIORITY_REPLY):
+        self._refill(time.monotonic())
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.seq), future))
+        self._schedule()
+        await future
+
+    def pause(self, seconds: float):
+        """Hand out nothing for `seconds`, e.g. after Telegram answers RetryAfter"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def _schedule(self):
+        if self._timer is not None or not self.waiters:
+            return
+        now = time.monotonic()
+        delay = max(self.blocked_until - now, 0) + max(1 - self.tokens, 0) / self.rate
+        self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill(time.monotonic())
+        waiters = self.waiters
+        while waiters and self.tokens >= 1:
+            future = heapq.heappop(waiters)[2]
+            if not future.done():  # cancelled waiters don't use a token
+                future.set_result(None)
+                self.tokens -= 1
+        self._schedule()
+
+class PendingEdit:
+    """A queued edit that newer edits of the same message fold into"""
+    __slots__ = ('args', 'future', 'merged')
+
+    def __init__(self, args):
+        self.args = args
+        self.future = asyncio.get_running_loop().create_future()
+        self.merged = 0
+
+class OutboundScheduler(BaseRateLimiter):
+    """Rate limiter for every Bot API call the application makes
+
+    Each call waits on its chat's bucket, then on the global bucket, in priority
+    order: deliveries, then replies and edits, then progress notes, deletes and
+    chat actions. RetryAfter pauses the bucket that overflowed and the call is
+    retried. An edit still waiting for a token is replaced by a newer edit of
+    the same message, so only the final text is sent. `rate_limit_args`, when given, overrides the priority.
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, global_burst: float = TELEGRAM_GLOBAL_BURST,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, chat_burst: float = TELEGRAM_CHAT_BURST,
+                 group_rate: float = TELEGRAM_GROUP_RATE, max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self.pending_edits = {}  # (endpoint, chat_id, message_id) -> PendingEdit
+        self.merged = 0
+        self.retried = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.chat_buckets = {k: b for k, b in self.chat_buckets.items() if not b.idle}
+            try:
+                # Private chats have positive ids; groups and channels get the stricter limit
+                is_private = int(chat_id) > 0
+            except (TypeError, ValueError):
+                is_private = False
+            if is_private:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        chat_id = data.get('chat_id')
+        priority = rate_limit_args if rate_limit_args is not None else ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_REPLY)
+
+        edit_key = None
+        if endpoint in MERGEABLE_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (endpoint, chat_id, data['message_id'])
+            pending = self.pending_edits.get(edit_key)
+            if pending is not None:
+                pending.args = args
+                pending.merged += 1
+                self.merged += 1
+                return await asyncio.shield(pending.future)
+            pending = self.pending_edits[edit_key] = PendingEdit(args)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                chat = self.chat_bucket(chat_id) if chat_id is not None else None
+                if chat is not None:
+                    await chat.acquire(priority)
+                await self.global_bucket.acquire(priority)
+
+                if edit_key is not None and self.pending_edits.get(edit_key) is pending:
+                    # From here on newer edits queue separately
+                    del self.pending_edits[edit_key]
+                    args = pending.args
+
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.retried += 1
+                    logger.info(f"Flood limit on {endpoint} for chat {chat_id}, retrying in {e.retry_after}s")
+                    (chat or self.global_bucket).pause(e.retry_after)
+                    if edit_key is not None:
+                        newer = self.pending_edits.get(edit_key)
+                        if newer is None:
+                            # Queue again as the pending edit so newer edits still fold into this one
+                            self.pending_edits[edit_key] = pending
+                        else:
+                            # A newer edit queued meanwhile; resending this one would put stale text last
+                            newer.merged += 1
+                            self.merged += 1
+                            result = await asyncio.shield(newer.future)
+                            if pending.merged:
+                                pending.future.set_result(result)
+                            return result
+                    continue
+
+                if edit_key is not None and pending.merged:
+                    pending.future.set_result(result)
+                return result
+        except BaseException as e:
+            if edit_key is not None:
+                if self.pending_edits.get(edit_key) is pending:
+                    del self.pending_edits[edit_key]
+                if pending.merged and not pending.future.done():
+                    if isinstance(e, Exception):
+                        pending.future.set_exception(e)
+                    else:
+                        pending.future.cancel()
+            raise
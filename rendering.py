@@ -0,0 +1,185 @@
+import sys
+import time
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.constants import ParseMode
+from telegram.helpers import escape_markdown
+
+from config import RESULTS_PER_PAGE, INLINE_PAGE_SIZE, PAGE_CACHE_BYTES
+from database import catalog
+from result_store import result_store
+from metrics import metrics, render_latency
+
+# Result pages are MarkdownV2: unlike legacy Markdown it can escape every
+# special character, including inside bold, so any file name renders
+RESULTS_PARSE_MODE = ParseMode.MARKDOWN_V2
+
+CAPTION_PREVIEW_LENGTH = 50
+
+HELP_ROW = (InlineKeyboardButton("❓ Help", callback_data="help_btn"),)
+
+# Rough heap cost of built PTB objects, measured with tracemalloc; pages are sized by them
+KEYBOARD_BUTTON_BYTES = 520
+INLINE_ARTICLE_BYTES = 1600
+
+class PageCache:
+    """Rendered pages keyed by (set_id, page, catalog version), least recently used dropped past max_bytes
+
+    Kept apart from the result sets: a set costs well under a kilobyte, a
+    rendered page several, so memoizing on the sets would let MAX_RESULT_SETS
+    grow pages without bound. Keys from older catalog versions are never hit
+    again and age out like any other entry.
+    """
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (size, value)
+        self.bytes = 0
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, value, size: int):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[0]
+        self.entries[key] = (size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][0]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+# Global instance
+page_cache = PageCache()
+
+metrics.gauge('page_cache_bytes', 'Estimated size of memoized result pages', lambda: page_cache.bytes)
+
+def md(text: str) -> str:
+    """Escape text for MarkdownV2"""
+    return escape_markdown(text, version=2)
+
+def md_code(text: str) -> str:
+    """Escape text for a MarkdownV2 `code` span"""
+    return escape_markdown(text, version=2, entity_type='code')
+
+def file_line(record) -> str:
+    """Display line for a file, after its number; built once per record and kept on it"""
+    line = record.display
+    if line is None:
+        size_mb = record.file_size // (1024 * 1024) if record.file_size > 0 else 0
+        caption = record.file_caption
+        if caption and len(caption) > CAPTION_PREVIEW_LENGTH:
+            caption = caption[:CAPTION_PREVIEW_LENGTH] + "..."
+        caption_text = f" \\- {md(caption)}" if caption else ""
+        line = record.display = f"{md(record.file_name)}* \\({size_mb}MB\\){caption_text}\n\n"
+    return line
+
+def searching_text(query: str) -> str:
+    return f"🔍 Searching for: `{md_code(query)}`\\.\\.\\."
+
+def no_results_text(query: str) -> str:
+    return (
+        f"❌ No results found for: `{md_code(query)}`\n\n"
+        f"💡 Try:\n• Different keywords\n• Partial book names\n• Author names"
+    )
+
+SEARCH_ERROR_TEXT = md("❌ An error occurred while searching. Please try again.")
+
+def render_results_page(result_set, page: int) -> tuple:
+    """Message text and keyboard for a page of search results, memoized in page_cache"""
+    started = time.perf_counter()
+    start_idx = page * RESULTS_PER_PAGE
+    total_pages = (len(result_set) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
+    # Ingestion can replace files in the set, so pages are only reused within a catalog version
+    key = (result_set.set_id, page, catalog.version)
+    cached = page_cache.get(key)
+    if cached is None:
+        text = page_text(result_set, page, start_idx, total_pages)
+        shown = min(RESULTS_PER_PAGE, len(result_set) - start_idx)
+        reply_markup = page_keyboard(result_set.set_id, page, start_idx, shown, total_pages)
+        buttons = sum(len(row) for row in reply_markup.inline_keyboard)
+        cached = text, reply_markup
+        page_cache.put(key, cached, sys.getsizeof(text) + buttons * KEYBOARD_BUTTON_BYTES)
+    render_latency.observe(time.perf_counter() - started)
+    return cached
+
+def page_text(result_set, page: int, start_idx: int, total_pages: int) -> str:
+    page_results = result_store.records(result_set, start_idx, start_idx + RESULTS_PER_PAGE)
+    parts = [
+        f"🔍 *Search Results for:* `{md_code(result_set.query)}`\n"
+        f"📄 *Found {len(result_set)} files*\n"
+        f"📑 *Page {page + 1}/{total_pages}*\n\n"
+        f"💡 *Select a file to get verification link*\n\n"
+    ]
+    for i, file_info in enumerate(page_results, start_idx + 1):
+        if file_info is None:
+            parts.append(f"*{i}\\. \\(file removed\\)*\n\n")
+        else:
+            parts.append(f"*{i}\\. ")
+            parts.append(file_line(file_info))
+    return ''.join(parts)
+
+def page_keyboard(set_id: str, page: int, start_idx: int, shown: int, total_pages: int) -> InlineKeyboardMarkup:
+    # File selection buttons (2 per row)
+    buttons = [
+        InlineKeyboardButton(f"📥 {i + 1}", callback_data=f"verify_{set_id}_{start_idx + i}")
+        for i in range(shown)
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+    # Navigation buttons
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"page_{set_id}_{page - 1}"))
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{set_id}_{page + 1}"))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+
+    # Always show help button
+    keyboard.append(HELP_ROW)
+    return InlineKeyboardMarkup(keyboard)
+
+def render_inline_page(result_set, offset: int) -> tuple:
+    """Inline query results from `offset`, and the next offset ('' at the end), memoized in page_cache"""
+    key = (result_set.set_id, ('inline', offset), catalog.version)
+    cached = page_cache.get(key)
+    if cached is not None:
+        return cached
+
+    set_id = result_set.set_id
+    records = result_store.records(result_set, offset, offset + INLINE_PAGE_SIZE)
+    articles = []
+    for idx, record in enumerate(records, offset):
+        if record is None:
+            continue
+        size_mb = record.file_size // (1024 * 1024) if record.file_size > 0 else 0
+        description = f"{size_mb}MB"
+        if record.file_caption:
+            description += f" · {record.file_caption[:CAPTION_PREVIEW_LENGTH]}"
+        articles.append(InlineQueryResultArticle(
+            id=f"{set_id}_{idx}",
+            title=record.file_name,
+            description=description,
+            input_message_content=InputTextMessageContent(
+                f"📚 *{md(record.file_name)}* \\({size_mb}MB\\)",
+                parse_mode=RESULTS_PARSE_MODE
+            ),
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("📥 Get this file", callback_data=f"verify_{set_id}_{idx}")
+            ]])
+        ))
+
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(result_set) else ''
+    page_cache.put(key, (articles, next_offset), len(articles) * INLINE_ARTICLE_BYTES)
+    return articles, next_offset
@@ -0,0 +1,110 @@
+import time
+import secrets
+from array import array
+from collections import OrderedDict
+
+from config import RESULT_SET_TTL, MAX_RESULT_SETS
+from search_engine import tokenize
+from database import catalog
+
+class ResultSet:
+    """Ranked global doc ids for one query, shared by every user who ran it"""
+    __slots__ = ('set_id', 'key', 'query', 'doc_ids', 'expires_at')
+
+    def __init__(self, set_id: str, key: tuple, query: str, doc_ids: array, expires_at: float):
+        self.set_id = set_id
+        self.key = key
+        self.query = query
+        self.doc_ids = doc_ids
+        self.expires_at = expires_at
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+class ResultSetStore:
+    """Short-ID result sets for pagination callbacks, with LRU and TTL eviction"""
+
+    def __init__(self, ttl: float = RESULT_SET_TTL, max_sets: int = MAX_RESULT_SETS):
+        self.ttl = ttl
+        self.max_sets = max_sets
+        self.sets = OrderedDict()  # set_id -> ResultSet, oldest expiry first
+        self.by_key = {}           # (catalog version, mode, tokens) -> set_id
+
+    def find(self, query: str, mode: str = 'search') -> ResultSet:
+        """Live set for a query already stored under this catalog version, or None"""
+        set_id = self.by_key.get(self.make_key(query, mode))
+        return self.get(set_id) if set_id is not None else None
+
+    def put(self, query: str, results: list, mode: str = 'search') -> ResultSet:
+        """Store results for a query, reusing a live set for the same query
+
+        `mode` keeps sets ranked differently for the same words apart, e.g. inline
+        prefix results from message search results.
+        """
+        now = time.monotonic()
+        self._evict(now)
+
+        key = self.make_key(query, mode)
+        set_id = self.by_key.get(key)
+        if set_id is not None:
+            result_set = self.sets.get(set_id)
+            if result_set is not None:
+                self._touch(result_set, now)
+                return result_set
+
+        set_id = secrets.token_hex(4)
+        while set_id in self.sets:
+            set_id = secrets.token_hex(4)
+
+        doc_ids = array('I', (doc_id for doc_id in map(catalog.global_id, results) if doc_id is not None))
+        result_set = ResultSet(set_id, key, query, doc_ids, now + self.ttl)
+        self.sets[set_id] = result_set
+        self.by_key[key] = set_id
+        return result_set
+
+    @staticmethod
+    def make_key(query: str, mode: str) -> tuple:
+        return (catalog.version, mode, ' '.join(tokenize(query)))
+
+    def get(self, set_id: str) -> ResultSet:
+        """Look up a live result set and extend its lifetime"""
+        now = time.monotonic()
+        result_set = self.sets.get(set_id)
+        if result_set is None:
+            return None
+        if result_set.expires_at <= now:
+            self._drop(result_set)
+            return None
+        self._touch(result_set, now)
+        return result_set
+
+    def records(self, result_set: ResultSet, start: int, end: int) -> list:
+        """File records for a slice of the set; files replaced since are None"""
+        return [catalog.record(doc_id) for doc_id in result_set.doc_ids[start:end]]
+
+    def _touch(self, result_set: ResultSet, now: float):
+        # Constant TTL keeps the dict ordered by expiry, so eviction only checks the front
+        result_set.expires_at = now + self.ttl
+        self.sets.move_to_end(result_set.set_id)
+
+    def _drop(self, result_set: ResultSet):
+        del self.sets[result_set.set_id]
+        if self.by_key.get(result_set.key) == result_set.set_id:
+            del self.by_key[result_set.key]
+
+    def _evict(self, now: float):
+        while self.sets:
+            oldest = next(iter(self.sets.values()))
+            if oldest.expires_at > now and len(self.sets) < self.max_sets:
+                break
+            self._drop(oldest)
+
+    def clear(self):
+        self.sets.clear()
+        self.by_key.clear()
+
+    def __len__(self):
+        return len(self.sets)
+
+# Global instance
+result_store = ResultSetStore()
@@ -0,0 +1,130 @@
+import time
+import logging
+from collections import OrderedDict
+
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_REDIS_URL
+from database import catalog
+from search_engine import tokenize
+from search_workers import search_pool
+from metrics import metrics, search_latency
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+    """Bounded in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, files)
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, files: tuple):
+        self.entries[key] = (time.monotonic() + self.ttl, files)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class RedisBackend:
+    """Shared cache on a local Redis-protocol server through aiocache"""
+
+    def __init__(self, url: str, ttl: float):
+        from aiocache import Cache
+        self.cache = Cache.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key: str):
+        files = await self.cache.get(key)
+        return tuple(files) if files is not None else None
+
+    async def set(self, key: str, files: tuple):
+        await self.cache.set(key, list(files), ttl=self.ttl)
+
+    async def clear(self):
+        # Keys carry the catalog version, so stale ones simply expire
+        pass
+
+    def __len__(self):
+        return 0
+
+class SearchCache:
+    """Caches ranked (shard, file_id) lists per normalized query and catalog version"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self.backend = MemoryBackend(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+        if SEARCH_CACHE_REDIS_URL:
+            try:
+                self.backend = RedisBackend(SEARCH_CACHE_REDIS_URL, SEARCH_CACHE_TTL)
+            except Exception as e:
+                logger.error(f"Redis search cache unavailable, using memory: {e}")
+
+    async def clear(self):
+        self.version = None
+        await self.backend.clear()
+
+    def make_key(self, query: str, limit: int) -> str:
+        """Cache key: tokens as the index sees them, plus limit and catalog version"""
+        return f"search:{catalog.version}:{limit}:{' '.join(tokenize(query))}"
+
+    async def search(self, query: str, limit: int) -> list:
+        """search_files, in a search worker when there are any, with the result cache in front"""
+        if self.version != catalog.version:
+            # Ingestion changed the catalog; every cached ranking is stale
+            self.version = catalog.version
+            await self.backend.clear()
+
+        key = self.make_key(query, limit)
+        try:
+            files = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Search cache read error: {e}")
+            files = None
+
+        if files is not None:
+            self.hits += 1
+            lookup = catalog.lookup
+            return [record for record in (lookup(shard, file_id) for shard, file_id in files) if record is not None]
+
+        self.misses += 1
+        with search_latency.time():
+            results = await search_pool.search(query, limit)
+        try:
+            await self.backend.set(key, tuple((record.shard, record.file_id) for record in results))
+        except Exception as e:
+            logger.error(f"Search cache write error: {e}")
+        return results
+
+    def stats(self) -> dict:
+        """Hit/miss counters for /stats"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.backend)
+        }
+
+# Global instance
+search_cache = SearchCache()
+
+metrics.counter('search_cache_hits_total', 'Searches answered from the result cache', lambda: search_cache.hits)
+metrics.counter('search_cache_misses_total', 'Searches that ran against the index', lambda: search_cache.misses)
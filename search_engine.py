@@ -0,0 +1,703 @@
+import re
+import math
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain, repeat
+from operator import add, neg
+
+logger = logging.getLogger(__name__)
+
+_PDF_SUFFIX = re.compile(r'\.pdf$', re.IGNORECASE)
+_SEPARATORS = re.compile(r'[._-]')
+_TOKEN = re.compile(r'\w+')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Number of terms whose impact-ordered postings are kept between queries
+IMPACT_CACHE_SIZE = 1024
+IMPACT_REFRESH_GROWTH = 1.05
+
+# Fuzzy second pass: runs when the exact pass finds fewer than FUZZY_MIN_RESULTS files
+FUZZY_MIN_RESULTS = 5
+FUZZY_MAX_EXPANSIONS = 8        # vocabulary terms tried per query token
+PREFIX_MIN_LENGTH = 3
+INLINE_PREFIX_MIN_LENGTH = 2    # last token of an inline query completes from here on
+PREFIX_SCAN_LIMIT = 256         # completions considered before picking the most common
+PREFIX_PENALTY = 0.8
+EDIT_PENALTY = 0.6              # applied once per edit
+
+# Multi-token ranking reads the terms in impact order instead of scoring every match when the
+# smallest group has more postings than this, and reads at most RANK_MAX_POSTINGS of each term
+RANK_SCAN_LIMIT = 2000
+RANK_MAX_POSTINGS = 2048
+RANK_CHUNK = 256                # docs read from each term per round
+PREFIX_MAX_POSTINGS = 1024      # the same for queries still being typed
+
+# Sharded catalogs: a result's id across shards is its doc_id with the shard number in the low bits
+SHARD_BITS = 4
+MAX_SHARDS = 1 << SHARD_BITS
+
+
+def clean_filename(filename: str) -> str:
+    """Clean filename for better search"""
+    name = _PDF_SUFFIX.sub('', filename)
+    name = _SEPARATORS.sub(' ', name)
+    return name.lower().strip()
+
+
+def tokenize(text: str) -> list:
+    """Split text into normalized search tokens"""
+    if not text:
+        return []
+    return _TOKEN.findall(clean_filename(text))
+
+
+class IndexedFile:
+    """Compact file record returned by the search index"""
+    __slots__ = ('file_id', 'file_name', 'file_size', 'message_id', 'file_caption', 'shard', 'display')
+
+    def __init__(self, file_id: str, file_name: str, file_size: int, message_id: int, file_caption: str = None,
+                 shard: int = 0):
+        self.file_id = file_id
+        self.file_name = file_name
+        self.file_size = file_size or 0
+        self.message_id = message_id
+        self.file_caption = file_caption
+        self.shard = shard  # catalog shard, and so the storage channel message_id belongs to
+        self.display = None  # rendered result line, filled on first display
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from any object with the file attributes"""
+        return cls(row.file_id, row.file_name, row.file_size, row.message_id, row.file_caption)
+
+
+def trigrams(term: str) -> set:
+    """Padded character trigrams of a term"""
+    padded = f"$${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term: str) -> int:
+    """Edit distance tolerated for a query token of this length"""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    # Only the differing middle needs the dynamic program
+    shortest = min(len(a), len(b))
+    prefix = 0
+    while prefix < shortest and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    a = a[prefix:len(a) - suffix]
+    b = b[prefix:len(b) - suffix]
+    if not a or not b:
+        return min(max(len(a), len(b)), limit + 1)
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def _ranked(impacts: tuple, factor: float):
+    """(score, doc_id) pairs of one term in descending score order"""
+    weights, order = impacts
+    for doc_id in order:
+        yield factor * weights[doc_id], doc_id
+
+
+class TermMatcher:
+    """Prefix and typo-tolerant lookup over the index vocabulary"""
+
+    def __init__(self):
+        self.terms = []         # sorted vocabulary for prefix ranges
+        self.grams = {}         # (term length, trigram) -> terms of that length containing it
+        self.ready = False
+
+    def rebuild(self, vocabulary):
+        """Index every term of the vocabulary"""
+        self.terms = sorted(vocabulary)
+        self.grams = {}
+        for term in self.terms:
+            for gram in trigrams(term):
+                self.grams.setdefault((len(term), gram), []).append(term)
+        self.ready = True
+
+    def add_term(self, term: str):
+        """Register a term that just entered the vocabulary"""
+        if not self.ready:
+            return
+        self.terms.insert(bisect_left(self.terms, term), term)
+        for gram in trigrams(term):
+            self.grams.setdefault((len(term), gram), []).append(term)
+
+    def remove_term(self, term: str):
+        """Forget a term that left the vocabulary"""
+        if not self.ready:
+            return
+        i = bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            del self.terms[i]
+        for gram in trigrams(term):
+            key = (len(term), gram)
+            bucket = self.grams.get(key)
+            if bucket:
+                bucket.remove(term)
+                if not bucket:
+                    del self.grams[key]
+
+    def completions(self, prefix: str) -> list:
+        """Vocabulary terms starting with prefix, capped at PREFIX_SCAN_LIMIT"""
+        start = bisect_left(self.terms, prefix)
+        found = []
+        for term in self.terms[start:start + PREFIX_SCAN_LIMIT]:
+            if not term.startswith(prefix):
+                break
+            found.append(term)
+        return found
+
+    def similar(self, term: str, limit: int) -> list:
+        """(distance, term) pairs within `limit` edits of term"""
+        grams = trigrams(term)
+        # Each edit destroys at most three trigrams
+        needed = len(grams) - 3 * limit
+        counts = {}
+        # Only lengths reachable within `limit` edits are looked at
+        for length in range(max(1, len(term) - limit), len(term) + limit + 1):
+            for gram in grams:
+                for candidate in self.grams.get((length, gram), ()):
+                    counts[candidate] = counts.get(candidate, 0) + 1
+
+        found = []
+        for candidate, shared in counts.items():
+            if shared < needed or candidate == term:
+                continue
+            distance = bounded_edit_distance(term, candidate, limit)
+            if distance <= limit:
+                found.append((distance, candidate))
+        return found
+
+
+class SearchIndex:
+    """Token-level inverted index with BM25 ranking over file names and captions"""
+
+    def __init__(self, shard: int = 0):
+        self.shard = shard                  # stamped on every record added
+        self.collection = None              # ShardedIndex supplying idf when this is one shard of several
+        self.version = 0                    # catalog version the index reflects
+        self.clear()
+
+    def clear(self):
+        """Drop every indexed file"""
+        self.docs = []                      # doc_id -> IndexedFile, None once replaced
+        self.doc_ids = {}                   # file_id -> doc_id
+        self.doc_lengths = array('H')       # doc_id -> number of tokens
+        self.postings = {}                  # token -> array('I') of sorted doc_ids (memoryview when mapped)
+        self.frequencies = {}               # token -> array('H') term counts, parallel to postings
+        self.total_length = 0
+        # Never back to an earlier version: result sets and cached rankings are keyed by it
+        self.version += 1
+        self.impact_cache = {}              # token -> ({doc_id: weight}, doc_ids by weight)
+        self.impact_basis = 0               # doc count when impact_cache was last cleared
+        self.matcher = TermMatcher()        # built on the first fuzzy query
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _writable(self, token: str) -> tuple:
+        """Posting and frequency arrays for a token, copied out of a snapshot mapping if needed"""
+        posting = self.postings.get(token)
+        if posting is None:
+            posting = self.postings[token] = array('I')
+            freqs = self.frequencies[token] = array('H')
+            self.matcher.add_term(token)
+        elif isinstance(posting, memoryview):
+            posting = self.postings[token] = array('I', posting)
+            freqs = self.frequencies[token] = array('H', self.frequencies[token])
+        else:
+            freqs = self.frequencies[token]
+        return posting, freqs
+
+    def add(self, record: IndexedFile) -> int:
+        """Add a file to the index and return its doc_id"""
+        doc_id = len(self.docs)
+        tokens = tokenize(record.file_name) + tokenize(record.file_caption)
+
+        impact_cache = self.impact_cache
+        postings = self.postings
+        for token, count in Counter(tokens).items():
+            if impact_cache:
+                impact_cache.pop(token, None)
+            posting = postings.get(token)
+            if type(posting) is array:
+                freqs = self.frequencies[token]
+            else:
+                posting, freqs = self._writable(token)
+            posting.append(doc_id)
+            freqs.append(count if count < 0xFFFF else 0xFFFF)
+
+        record.shard = self.shard
+        self.docs.append(record)
+        self.doc_ids[record.file_id] = doc_id
+        self.doc_lengths.append(min(len(tokens), 0xFFFF))
+        self.total_length += len(tokens)
+        return doc_id
+
+    def remove(self, file_id: str) -> bool:
+        """Drop a file from the postings; its doc_id is never reused"""
+        doc_id = self.doc_ids.pop(file_id, None)
+        if doc_id is None:
+            return False
+
+        record = self.docs[doc_id]
+        tokens = tokenize(record.file_name) + tokenize(record.file_caption)
+        for token in set(tokens):
+            self.impact_cache.pop(token, None)
+            posting, freqs = self._writable(token)
+            j = bisect_left(posting, doc_id)
+            del posting[j]
+            del freqs[j]
+            if not posting:
+                del self.postings[token]
+                del self.frequencies[token]
+                self.matcher.remove_term(token)
+
+        self.docs[doc_id] = None
+        self.total_length -= len(tokens)
+        return True
+
+    def upsert(self, record: IndexedFile) -> int:
+        """Add a file, replacing any indexed file with the same file_id"""
+        self.remove(record.file_id)
+        return self.add(record)
+
+    def build(self, rows):
+        """Rebuild the index from an iterable of file rows"""
+        self.clear()
+        for row in rows:
+            self.add(IndexedFile.from_row(row))
+        logger.info(f"Search index built: {len(self.doc_ids)} files, {len(self.postings)} terms")
+
+    def document_frequency(self, token: str) -> int:
+        return len(self.postings.get(token, ()))
+
+    def idf(self, token: str) -> float:
+        """Inverse document frequency of a token, over every shard when this is one of several"""
+        stats = self if self.collection is None else self.collection
+        n = len(stats)
+        df = stats.document_frequency(token)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def impacts(self, token: str) -> tuple:
+        """BM25 weights (without idf) by doc_id, and the doc_ids ordered by weight
+
+        Length normalization uses the average over every shard when this is one of several.
+        """
+        stats = self if self.collection is None else self.collection
+        size = len(stats)
+        # Weights of untouched terms depend on the average length only; refresh them as it drifts
+        if size > self.impact_basis * IMPACT_REFRESH_GROWTH:
+            self.impact_cache.clear()
+            self.impact_basis = size
+
+        cached = self.impact_cache.get(token)
+        if cached is not None:
+            return cached
+
+        doc_lengths = self.doc_lengths
+        k1 = BM25_K1
+        norm_base = k1 * (1 - BM25_B)
+        norm_scale = k1 * BM25_B / ((stats.total_length / size) or 1.0)
+
+        weights = {
+            doc_id: tf * (k1 + 1) / (tf + norm_base + norm_scale * doc_lengths[doc_id])
+            for doc_id, tf in zip(self.postings[token], self.frequencies[token])
+        }
+        # Stable sort keeps equal weights in doc_id order
+        order = array('I', sorted(weights, key=weights.__getitem__, reverse=True))
+
+        if len(self.impact_cache) >= IMPACT_CACHE_SIZE:
+            # Keep the common terms: they cost the most to rebuild and recur the most
+            kept = heapq.nlargest(IMPACT_CACHE_SIZE // 4, self.impact_cache.items(), key=lambda item: len(item[1][1]))
+            self.impact_cache = dict(kept)
+        cached = self.impact_cache[token] = (weights, order)
+        return cached
+
+    def search(self, query: str, limit: int) -> list:
+        """Return the top `limit` files for a query, best first
+
+        Exact token matches are ranked first. When they are too few, a second
+        pass widens each token to vocabulary terms that extend it or are
+        within a small edit distance of it.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_ids or limit <= 0:
+            return []
+
+        results = self.exact_search(terms, limit)
+        if len(results) >= min(limit, FUZZY_MIN_RESULTS):
+            return results
+
+        seen = {record.file_id for record in results}
+        for record in self.fuzzy_search(terms, limit):
+            if len(results) == limit:
+                break
+            if record.file_id not in seen:
+                results.append(record)
+        return results
+
+    def records(self, hits: list) -> list:
+        """File records of (score, doc_id) hits"""
+        docs = self.docs
+        return [docs[doc_id] for _, doc_id in hits]
+
+    def exact_search(self, terms: list, limit: int) -> list:
+        """Top files containing every term"""
+        return self.records(self.exact_hits(terms, limit))
+
+    def exact_hits(self, terms: list, limit: int) -> list:
+        """(score, doc_id) of the top files containing every term, best first"""
+        if not self.doc_ids or limit <= 0:
+            return []
+        for term in terms:
+            if term not in self.postings:
+                return []
+        return self._rank([[(self.impacts(term), self.idf(term))] for term in terms], limit)
+
+    def prefix_search(self, query: str, limit: int) -> list:
+        """Top files for a query still being typed: the last token may be an unfinished word"""
+        return self.records(self.prefix_hits(list(dict.fromkeys(tokenize(query))), limit))
+
+    def prefix_hits(self, terms: list, limit: int) -> list:
+        """(score, doc_id) of the top files for typed tokens whose last one may be unfinished"""
+        if not terms or not self.doc_ids or limit <= 0:
+            return []
+        if not self.matcher.ready:
+            self.matcher.rebuild(self.postings)
+
+        groups = []
+        for term in terms[:-1]:
+            expansions = [(term, 1.0)] if term in self.postings else self.expand(term)
+            if not expansions:
+                return []
+            groups.append([(self.impacts(t), self.idf(t) * penalty) for t, penalty in expansions])
+
+        last = terms[-1]
+        completions = []
+        if len(last) >= INLINE_PREFIX_MIN_LENGTH:
+            completions = heapq.nlargest(
+                FUZZY_MAX_EXPANSIONS, self.matcher.completions(last),
+                key=lambda t: len(self.postings[t])
+            )
+        alternatives = [(t, 1.0 if t == last else PREFIX_PENALTY) for t in completions]
+        if last in self.postings and last not in completions:
+            alternatives.append((last, 1.0))
+        if not alternatives:
+            return []
+        groups.append([(self.impacts(t), self.idf(t) * penalty) for t, penalty in alternatives])
+        return self._rank(groups, limit, PREFIX_MAX_POSTINGS)
+
+    def expand(self, term: str) -> list:
+        """(term, penalty) alternatives for a query token, best first"""
+        if not self.matcher.ready:
+            self.matcher.rebuild(self.postings)
+
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+
+        if len(term) >= PREFIX_MIN_LENGTH:
+            completions = heapq.nlargest(
+                FUZZY_MAX_EXPANSIONS, self.matcher.completions(term),
+                key=lambda t: len(self.postings[t])
+            )
+            for completion in completions:
+                expansions.setdefault(completion, PREFIX_PENALTY)
+
+        limit = max_edits(term)
+        if limit:
+            for distance, similar in sorted(self.matcher.similar(term, limit)):
+                expansions.setdefault(similar, EDIT_PENALTY ** distance)
+
+        ranked = sorted(expansions.items(), key=lambda item: -item[1])
+        return ranked[:FUZZY_MAX_EXPANSIONS]
+
+    def fuzzy_search(self, terms: list, limit: int) -> list:
+        """Top files matching every token through a prefix or near-miss term"""
+        return self.records(self.fuzzy_hits(terms, limit))
+
+    def fuzzy_hits(self, terms: list, limit: int) -> list:
+        """(score, doc_id) of the top files matching every token through a prefix or near-miss term"""
+        if not self.doc_ids or limit <= 0:
+            return []
+        groups = []
+        for term in terms:
+            expansions = self.expand(term)
+            if not expansions:
+                return []
+            groups.append([(self.impacts(t), self.idf(t) * penalty) for t, penalty in expansions])
+        return self._rank(groups, limit)
+
+    def _rank(self, groups: list, limit: int, depth: int = RANK_MAX_POSTINGS) -> list:
+        """(score, doc_id) of the top docs matching every group of ((weights, order), factor) alternatives
+
+        A doc scores the best alternative of each group. A single token is
+        read off its impact order and stops after `limit` docs. Several tokens
+        filter the smallest group's docs through the others and score them
+        outright, unless that group is large: then every term is read in impact
+        order until a score bound shows the top-k is final, or for at most
+        RANK_MAX_POSTINGS docs each.
+        """
+        groups.sort(key=lambda group: sum(len(weights) for (weights, _), _ in group))
+        driver = groups[0]
+
+        if len(groups) == 1:
+            if len(driver) == 1:
+                # Already in rank order
+                (weights, order), factor = driver[0]
+                return [(factor * weights[doc_id], doc_id) for doc_id in order[:limit]]
+
+            top = []
+            seen = set()
+            for score, doc_id in heapq.merge(*(_ranked(*alternative) for alternative in driver), reverse=True):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    top.append((score, doc_id))
+                    if len(top) == limit:
+                        break
+            return top
+
+        driver_postings = sum(len(weights) for (weights, _), _ in driver)
+        if driver_postings > RANK_SCAN_LIMIT:
+            # Exact unless the walk ran out of depth: then docs past the first `depth` of
+            # every term are left out, so the tail of a broad query's ranking is approximate
+            top = self._scan_by_impact(groups, limit, depth)
+        else:
+            if len(driver) == 1:
+                matches = driver[0][0][0].keys()
+            else:
+                matches = set().union(*(weights.keys() for (weights, _), _ in driver))
+            top = heapq.nlargest(limit, self._score(matches, groups, 1))
+        return [(score, -neg_id) for score, neg_id in top]
+
+    @staticmethod
+    def _score(matches, groups: list, checked: int):
+        """(score, -doc_id) of the docs among `matches` that also match every group past the first `checked`"""
+        # Single terms filter with one lookup a doc, so they go before groups of several
+        for group in sorted(groups[checked:], key=len):
+            # Membership tests against the larger groups, never a scan of them
+            if len(group) == 1:
+                matches = list(filter(group[0][0][0].__contains__, matches))
+            else:
+                narrowed = set()
+                for (weights, _), _ in group:
+                    narrowed.update(filter(weights.__contains__, matches))
+                matches = list(narrowed)
+            if not matches:
+                return iter(())
+
+        # Column-wise scoring keeps the per-match loops inside map(); every match is in a
+        # single-alternative group's weights, so those need no default
+        totals = repeat(0.0)
+        for group in groups:
+            if len(group) == 1:
+                (weights, _), factor = group[0]
+                best = map(factor.__mul__, map(weights.__getitem__, matches))
+            else:
+                best = map(max, *(map(factor.__mul__, map(weights.get, matches, repeat(0.0)))
+                                  for (weights, _), factor in group))
+            totals = map(add, totals, best)
+        # Ties prefer earlier files
+        return zip(totals, map(neg, matches))
+
+    def _scan_by_impact(self, groups: list, limit: int, depth: int) -> list:
+        """Top-k (score, -doc_id) by reading every term in impact order, a chunk at a time
+
+        Each round reads the next RANK_CHUNK docs of every term and scores
+        the new ones outright. A doc not read yet scores at most the sum, over
+        groups, of the best weight its terms have left (the threshold
+        algorithm), so once the k-th score reaches that bound the top-k is
+        final. For broad queries that is long before any list is exhausted.
+        After `depth` docs of each term it stops with the best docs read.
+
+        Common terms have long runs of equal weights, which would hold the
+        bound at the k-th score for thousands of docs. Within a run docs come
+        in doc_id order, so a doc that could only tie the k-th score has an
+        id past the position read in some term giving each group's bound, and
+        loses the tie once those are past the k-th doc's.
+        """
+        positions = [[0] * len(group) for group in groups]
+        top = []  # (score, -doc_id), best first
+        seen = set()
+        for _ in range(0, depth, RANK_CHUNK):
+            fresh = set()
+            for group, group_positions in zip(groups, positions):
+                for i, ((_, order), _) in enumerate(group):
+                    position = group_positions[i]
+                    if position < len(order):
+                        fresh.update(order[position:position + RANK_CHUNK])
+                        group_positions[i] = position + RANK_CHUNK
+            fresh -= seen
+            seen |= fresh
+            scored = self._score(fresh, groups, 0)
+            if len(top) == limit:
+                # Only docs beating the current k-th can enter, which is few after the first rounds
+                scored = filter(top[-1].__lt__, scored)
+            top = heapq.nlargest(limit, chain(top, scored))
+
+            # Added in the order _score adds them, so the bound rounds the way a real score would
+            bound = 0.0
+            furthest = 0
+            for group, group_positions in zip(groups, positions):
+                best, first = 0.0, 0
+                for ((weights, order), factor), position in zip(group, group_positions):
+                    if position < len(order):
+                        doc_id = order[position]
+                        weight = factor * weights[doc_id]
+                        if weight > best:
+                            best, first = weight, doc_id
+                        elif weight == best:
+                            first = min(first, doc_id)
+                if not best:
+                    # Every doc matching this group has been read
+                    return top
+                bound += best
+                furthest = max(furthest, first)
+
+            if len(top) == limit:
+                kth_score, kth_neg_id = top[-1]
+                if bound < kth_score or (bound == kth_score and -kth_neg_id < furthest):
+                    return top
+        return top
+
+
+class ShardedIndex:
+    """Several SearchIndex shards searched as one collection
+
+    A query runs on every shard and the per-shard rankings, each already best
+    first, are merged k-way: the heap holds one entry per shard and the merge
+    stops after `limit` results, so the cost past the shards themselves is
+    O(limit log shards). Shards score with idf and average length over the
+    whole collection, so their scores are comparable and a sharded catalog
+    ranks as one index over the same files would. A file stored in several
+    shards is listed once, from the lowest shard.
+    """
+
+    def __init__(self, indexes: list):
+        if len(indexes) > MAX_SHARDS:
+            raise ValueError(f"At most {MAX_SHARDS} shards are supported")
+        self.indexes = indexes
+        for index in indexes:
+            index.collection = self if len(indexes) > 1 else None
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    @property
+    def version(self) -> int:
+        """Changes whenever any shard's catalog does: shard versions only grow"""
+        return sum(index.version for index in self.indexes)
+
+    @property
+    def total_length(self) -> int:
+        return sum(index.total_length for index in self.indexes)
+
+    def document_frequency(self, token: str) -> int:
+        return sum(index.document_frequency(token) for index in self.indexes)
+
+    def global_id(self, record: IndexedFile) -> int:
+        """Id of an indexed record across shards, or None if it has been replaced"""
+        doc_id = self.indexes[record.shard].doc_ids.get(record.file_id)
+        return None if doc_id is None else doc_id << SHARD_BITS | record.shard
+
+    def record(self, global_id: int) -> IndexedFile:
+        """Record for a global id; None once replaced, or if the id is from an index since rebuilt"""
+        shard, doc_id = global_id & (MAX_SHARDS - 1), global_id >> SHARD_BITS
+        if shard >= len(self.indexes):
+            return None
+        docs = self.indexes[shard].docs
+        return docs[doc_id] if doc_id < len(docs) else None
+
+    def lookup(self, shard: int, file_id: str) -> IndexedFile:
+        """Current record of a file in a shard, or None"""
+        if shard >= len(self.indexes):
+            return None
+        index = self.indexes[shard]
+        doc_id = index.doc_ids.get(file_id)
+        return None if doc_id is None else index.docs[doc_id]
+
+    def search(self, query: str, limit: int) -> list:
+        """SearchIndex.search across shards: exact matches from every shard, then the fuzzy pass if they are too few"""
+        if len(self.indexes) == 1:
+            return self.indexes[0].search(query, limit)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+
+        results = self.merge([index.exact_hits(terms, limit) for index in self.indexes], limit)
+        if len(results) >= min(limit, FUZZY_MIN_RESULTS):
+            return results
+
+        seen = {(record.shard, record.file_id) for record in results}
+        for record in self.merge([index.fuzzy_hits(terms, limit) for index in self.indexes], limit):
+            if len(results) == limit:
+                break
+            if (record.shard, record.file_id) not in seen:
+                results.append(record)
+        return results
+
+    def prefix_search(self, query: str, limit: int) -> list:
+        """SearchIndex.prefix_search across shards"""
+        if len(self.indexes) == 1:
+            return self.indexes[0].prefix_search(query, limit)
+        terms = list(dict.fromkeys(tokenize(query)))
+        return self.merge([index.prefix_hits(terms, limit) for index in self.indexes], limit)
+
+    def merge(self, hits_by_shard: list, limit: int) -> list:
+        """Top `limit` records of per-shard (score, doc_id) lists, each best first
+
+        Ties go to the lower shard, then the earlier file, as within one index.
+        """
+        streams = [
+            [(-score, shard, doc_id) for score, doc_id in hits]
+            for shard, hits in enumerate(hits_by_shard) if hits
+        ]
+        results = []
+        seen = set()
+        for _, shard, doc_id in heapq.merge(*streams):
+            record = self.indexes[shard].docs[doc_id]
+            if record.file_id in seen:
+                continue
+            seen.add(record.file_id)
+            results.append(record)
+            if len(results) == limit:
+                break
+        return results
+
+
+# Global instance: shard 0, and the only shard unless more storage channels are configured
+search_index = SearchIndex()
@@ -0,0 +1,348 @@
+import gc
+import os
+import pickle
+import signal
+import struct
+import asyncio
+import logging
+import multiprocessing
+from array import array
+from itertools import count
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import send_handle, recv_handle
+
+from config import SEARCH_WORKERS, SEARCH_WORKER_DEPTH, SEARCH_WORKER_TIMEOUT
+from database import shards, catalog, index_files, search_files, prefix_search_files
+from search_engine import IndexedFile
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Message kinds sent to a worker
+SEARCH = 1
+PREFIX_SEARCH = 2
+INDEX_UPDATE = 3  # followed by a pickled (shard, version, rows)
+SPAWN = 4  # to the zygote, followed by the new worker's end of its pipe as a passed fd
+# Seconds stop() waits for the zygote to exit when no event loop is running
+ZYGOTE_EXIT_TIMEOUT = 2.0
+
+# kind, request id, limit; the query follows as UTF-8
+_REQUEST = struct.Struct('<BIH')
+# request id, catalog version, ok; the results follow as uint32 global ids.
+# Request id 0 is a worker's hello, with its pid in place of the version
+_RESPONSE = struct.Struct('<IQ?')
+
+class SearchUnavailable(Exception):
+    """No worker answered in time: the pool is saturated, the search too slow, or the worker died"""
+
+def _apply_update(message: bytes):
+    # Same upserts in the same order as the parent, so doc_ids stay identical
+    number, version, rows = pickle.loads(message[1:])
+    index_files([IndexedFile(*row) for row in rows], version, shards[number])
+
+def _serve(conn):
+    """Worker process: answer requests from the index inherited from the zygote"""
+    conn.send_bytes(_RESPONSE.pack(0, os.getpid(), True))
+    searches = {SEARCH: catalog.search, PREFIX_SEARCH: catalog.prefix_search}
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+
+        if message[0] == INDEX_UPDATE:
+            _apply_update(message)
+            continue
+
+        kind, request_id, limit = _REQUEST.unpack_from(message)
+        try:
+            results = searches[kind](message[_REQUEST.size:].decode('utf-8'), limit)
+            ids = array('I', map(catalog.global_id, results))
+            conn.send_bytes(_RESPONSE.pack(request_id, catalog.version, True) + ids.tobytes())
+        except Exception:
+            conn.send_bytes(_RESPONSE.pack(request_id, catalog.version, False))
+
+def _zygote(control, parent_end):
+    """Forks workers on request, from a process that keeps the catalog current and never runs a loop or threads"""
+    # Inherited from the fork; holding it open would keep the zygote from seeing the parent close
+    parent_end.close()
+    # Ctrl-C goes to the whole process group; the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    children = set()
+    while True:
+        try:
+            message = control.recv_bytes()
+        except (EOFError, OSError):
+            break
+        _reap(children, os.WNOHANG)
+
+        if message[0] == INDEX_UPDATE:
+            _apply_update(message)
+            continue
+
+        fd = recv_handle(control)
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                control.close()
+                _serve(Connection(fd))
+            finally:
+                os._exit(0)
+        children.add(pid)
+        os.close(fd)
+
+    # The parent is gone or stopping: take the workers down with the zygote rather than orphan them
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _reap(children, 0)
+
+def _reap(children: set, options: int):
+    """Collect exited workers; with options 0, wait for all of them"""
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, options)
+        except ChildProcessError:
+            children.clear()
+            return
+        if pid == 0:
+            return
+        children.discard(pid)
+
+class SearchWorker:
+    __slots__ = ('pid', 'conn', 'pending')
+
+    def __init__(self, conn):
+        self.pid = None  # known once the worker says hello
+        self.conn = conn
+        self.pending = {}  # request id -> future
+
+class SearchWorkerPool:
+    """Runs searches in forked worker processes so slow queries never stall the event loop
+
+    Once the catalog is loaded, and before the event loop starts any threads,
+    a zygote process is forked; every worker, first or replacement, is forked
+    from it, never from the bot with its loop, threads, sockets and other
+    workers' pipes. Workers share the catalog copy-on-write: snapshot posting
+    lists are views of a read-only mapping, so they stay in the page cache
+    once for every process, and the heap is frozen out of the garbage
+    collector first so collections don't copy it page by page. Requests are a
+    packed header plus the query, answers the ranked global ids as uint32, so
+    no records cross the pipe. Files ingested after the fork are sent to the
+    zygote and every worker ahead of any later request.
+
+    Each worker takes SEARCH_WORKER_DEPTH requests at a time; past that,
+    searches wait for a slot and are shed once SEARCH_WORKER_TIMEOUT runs
+    out. A worker still busy at the deadline is killed and replaced, and the
+    searches queued on it fail with SearchUnavailable. Nothing here waits on
+    a process: the zygote reaps its workers and asks for new ones without
+    waiting for the fork.
+    """
+
+    def __init__(self, workers: int = SEARCH_WORKERS, depth: int = SEARCH_WORKER_DEPTH,
+                 timeout: float = SEARCH_WORKER_TIMEOUT):
+        self.size = workers
+        self.depth = depth
+        self.timeout = timeout
+        self.context = multiprocessing.get_context('fork')
+        self.zygote = None
+        self.control = None  # pipe to the zygote
+        self.workers = []
+        self.request_ids = count()
+        self.slots = None  # semaphore of free requests, created in the loop
+        self.loop = None
+        self.timeouts = 0
+        self.shed = 0
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def in_flight(self) -> int:
+        return sum(len(worker.pending) for worker in self.workers)
+
+    def start(self):
+        """Fork the zygote and the workers; call once the catalog is loaded, before the event loop starts threads"""
+        if self.size <= 0 or self.zygote is not None:
+            return
+        gc.freeze()
+        self.control, child = self.context.Pipe()
+        self.zygote = self.context.Process(target=_zygote, args=(child, self.control), name='search-zygote',
+                                           daemon=True)
+        self.zygote.start()
+        child.close()
+        for _ in range(self.size):
+            self.workers.append(self._spawn())
+        logger.info(f"Started {self.size} search workers")
+
+    def _spawn(self) -> SearchWorker:
+        """Ask the zygote for a worker on a new pipe; raises OSError if the zygote is gone"""
+        parent, child = self.context.Pipe()
+        try:
+            self.control.send_bytes(bytes([SPAWN]))
+            send_handle(self.control, child.fileno(), self.zygote.pid)
+        except OSError:
+            parent.close()
+            raise
+        finally:
+            child.close()
+        worker = SearchWorker(parent)
+        if self.loop is not None:
+            self.loop.add_reader(parent.fileno(), self._on_readable, worker)
+        return worker
+
+    def _attach(self):
+        """Watch the workers' pipes from the running loop, on the first search"""
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.size * self.depth)
+        for worker in self.workers:
+            self.loop.add_reader(worker.conn.fileno(), self._on_readable, worker)
+
+    def _on_readable(self, worker: SearchWorker):
+        try:
+            message = worker.conn.recv_bytes()
+        except (EOFError, OSError):
+            self._replace(worker, "exited")
+            return
+        request_id, version, ok = _RESPONSE.unpack_from(message)
+        if request_id == 0:
+            worker.pid = version
+            return
+        future = worker.pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(array('I', message[_RESPONSE.size:]))
+        else:
+            future.set_exception(SearchUnavailable("Search failed in a worker"))
+
+    def _retire(self, worker: SearchWorker):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        if worker.pid is not None:
+            try:
+                os.kill(worker.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        # Without a pid yet, the closed pipe stops the worker after its current search
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(SearchUnavailable("Search worker was restarted"))
+        worker.pending.clear()
+
+    def _replace(self, worker: SearchWorker, reason: str):
+        if worker not in self.workers:
+            return
+        logger.warning(f"Search worker {worker.pid} {reason}; starting a new one")
+        self._retire(worker)
+        try:
+            # Forked from the zygote's current catalog, so the new worker needs none of the earlier updates
+            self.workers[self.workers.index(worker)] = self._spawn()
+        except OSError as e:
+            logger.error(f"Search worker zygote is gone, {len(self.workers) - 1} workers left: {e}")
+            self.workers.remove(worker)
+            return
+        self.restarts += 1
+
+    async def search(self, query: str, limit: int) -> list:
+        """search_files in a worker, or on the loop when there are none"""
+        if not self.workers:
+            return search_files(query, limit)
+        return await self._request(SEARCH, query, limit)
+
+    async def prefix_search(self, query: str, limit: int) -> list:
+        """prefix_search_files in a worker, or on the loop when there are none"""
+        if not self.workers:
+            return prefix_search_files(query, limit)
+        return await self._request(PREFIX_SEARCH, query, limit)
+
+    async def _request(self, kind: int, query: str, limit: int) -> list:
+        if self.loop is None:
+            self._attach()
+        deadline = self.loop.time() + self.timeout
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise SearchUnavailable("Search workers are saturated")
+
+        try:
+            if not self.workers:
+                raise SearchUnavailable("No search workers left")
+            worker = min(self.workers, key=lambda w: len(w.pending))
+            # 0 is the workers' hello
+            request_id = next(self.request_ids) % 0xFFFFFFFF + 1
+            future = worker.pending[request_id] = self.loop.create_future()
+            try:
+                worker.conn.send_bytes(_REQUEST.pack(kind, request_id, limit) + query.encode('utf-8'))
+            except OSError:
+                self._replace(worker, "exited")
+                raise SearchUnavailable("Search worker exited")
+            try:
+                ids = await asyncio.wait_for(future, max(0.0, deadline - self.loop.time()))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                worker.pending.pop(request_id, None)
+                self._replace(worker, f"took over {self.timeout}s on a search")
+                raise SearchUnavailable("Search timed out")
+        finally:
+            self.slots.release()
+
+        # Files replaced since the worker ranked them are gone
+        record = catalog.record
+        return [r for r in map(record, ids) if r is not None]
+
+    def index_files(self, files: list, version: int, shard: int):
+        """Apply an ingested batch, already in the parent's index, to the zygote and every worker"""
+        if self.zygote is None:
+            return
+        rows = [(f.file_id, f.file_name, f.file_size, f.message_id, f.file_caption) for f in files]
+        message = bytes([INDEX_UPDATE]) + pickle.dumps((shard, version, rows), pickle.HIGHEST_PROTOCOL)
+        try:
+            # Before any later spawn request, so workers forked from now on have the batch
+            self.control.send_bytes(message)
+        except OSError as e:
+            logger.error(f"Search worker zygote is gone: {e}")
+        for worker in list(self.workers):
+            try:
+                # Ingest batches are small; a full pipe only blocks until the worker's current search ends
+                worker.conn.send_bytes(message)
+            except OSError:
+                # Its replacement is forked from the updated index
+                self._replace(worker, "exited")
+
+    def stop(self):
+        """Kill the workers and close the zygote's pipe; it exits on end of file"""
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            self._retire(worker)
+        if self.zygote is not None:
+            self.control.close()
+            self._reap_zygote(self.zygote)
+            self.zygote = self.control = None
+
+    def _reap_zygote(self, zygote):
+        """Collect the zygote once it exits, from the loop's reader when there is a loop to keep free"""
+        if self.loop is None or self.loop.is_closed() or not self.loop.is_running():
+            zygote.join(ZYGOTE_EXIT_TIMEOUT)
+            return
+
+        def exited():
+            self.loop.remove_reader(zygote.sentinel)
+            zygote.join(0)
+        self.loop.add_reader(zygote.sentinel, exited)
+
+# Global instance
+search_pool = SearchWorkerPool()
+
+metrics.counter('search_worker_timeouts_total', 'Searches abandoned after SEARCH_WORKER_TIMEOUT',
+                lambda: search_pool.timeouts)
+metrics.counter('search_shed_total', 'Searches refused while every worker slot was busy', lambda: search_pool.shed)
+metrics.counter('search_worker_restarts_total', 'Search workers replaced after a timeout or crash',
+                lambda: search_pool.restarts)
+metrics.gauge('search_worker_requests', 'Searches sent to workers and not yet answered', search_pool.in_flight)
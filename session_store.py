@@ -0,0 +1,195 @@
+import json
+import time
+import logging
+from collections import deque
+from peewee import SqliteDatabase, Model, IntegerField, CharField, TextField, FloatField
+
+from config import VERIFICATION_TIMEOUT, SESSION_STORE, SESSION_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+class VerificationSession:
+    """Pending verification for one user"""
+    __slots__ = ('user_id', 'file_data', 'verification_token', 'created_at', 'expires_at', 'attempts')
+
+    def __init__(self, user_id: int, file_data: dict, verification_token: str,
+                 created_at: float, expires_at: float = None, attempts: int = 0):
+        self.user_id = user_id
+        self.file_data = file_data
+        self.verification_token = verification_token
+        self.created_at = created_at
+        self.expires_at = expires_at if expires_at is not None else created_at + VERIFICATION_TIMEOUT
+        self.attempts = attempts
+
+class SessionStore:
+    """Storage for pending verification sessions, one per user
+
+    Times are wall-clock seconds so sessions stay meaningful across restarts
+    and between processes sharing a store.
+    """
+    blocking = False  # calls wait on I/O or locks, so VerificationSystem runs them in a thread
+
+    def put(self, session: VerificationSession):
+        raise NotImplementedError
+
+    def get(self, user_id: int) -> VerificationSession:
+        """Live session for a user, or None"""
+        raise NotImplementedError
+
+    def consume(self, user_id: int, token: str) -> dict:
+        """Atomically remove a live session whose token matches, returning its file_data"""
+        raise NotImplementedError
+
+    def record_attempt(self, user_id: int) -> int:
+        """Count a failed verification attempt, returning the session's attempts so far (0 without a session)"""
+        raise NotImplementedError
+
+    def remove(self, user_id: int):
+        raise NotImplementedError
+
+    def expire(self) -> int:
+        """Drop expired sessions, returning how many were dropped"""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    """Process-local sessions; lost on restart"""
+
+    def __init__(self):
+        self.sessions = {}  # user_id -> VerificationSession
+        # Every session lives VERIFICATION_TIMEOUT, so creation order is expiry order:
+        # a FIFO queue gives O(1) expiry without scanning the live sessions
+        self.expiry_queue = deque()
+
+    def put(self, session: VerificationSession):
+        self.sessions[session.user_id] = session
+        self.expiry_queue.append(session)
+
+    def get(self, user_id: int) -> VerificationSession:
+        session = self.sessions.get(user_id)
+        if session is None or session.expires_at <= time.time():
+            return None
+        return session
+
+    def consume(self, user_id: int, token: str) -> dict:
+        # Runs without awaiting, so it is atomic within the event loop
+        session = self.get(user_id)
+        if session is None or session.verification_token != token:
+            return None
+        del self.sessions[user_id]
+        return session.file_data
+
+    def record_attempt(self, user_id: int) -> int:
+        session = self.sessions.get(user_id)
+        if session is None:
+            return 0
+        session.attempts += 1
+        return session.attempts
+
+    def remove(self, user_id: int):
+        self.sessions.pop(user_id, None)
+
+    def expire(self) -> int:
+        now = time.time()
+        queue = self.expiry_queue
+        expired = 0
+        while queue and queue[0].expires_at <= now:
+            session = queue.popleft()
+            # Sessions replaced or consumed earlier are no longer in the dict
+            if self.sessions.get(session.user_id) is session:
+                del self.sessions[session.user_id]
+                expired += 1
+        return expired
+
+    def __len__(self):
+        return len(self.sessions)
+
+session_db = SqliteDatabase(None)
+
+class StoredSession(Model):
+    user_id = IntegerField(primary_key=True)
+    verification_token = CharField()
+    file_data = TextField()
+    created_at = FloatField()
+    expires_at = FloatField(index=True)
+    attempts = IntegerField(default=0)
+
+    class Meta:
+        database = session_db
+        table_name = 'verification_sessions'
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a WAL-mode SQLite file, shared by every worker on the host and kept across restarts
+
+    Another process holding the write lock makes a call wait up to busy_timeout,
+    so calls run in worker threads, each with its own connection.
+    """
+    blocking = True
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        session_db.init(path, pragmas={
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 5000
+        })
+        session_db.connect(reuse_if_open=True)
+        session_db.create_tables([StoredSession])
+
+    def put(self, session: VerificationSession):
+        StoredSession.replace(
+            user_id=session.user_id,
+            verification_token=session.verification_token,
+            file_data=json.dumps(session.file_data),
+            created_at=session.created_at,
+            expires_at=session.expires_at,
+            attempts=session.attempts
+        ).execute()
+
+    def get(self, user_id: int) -> VerificationSession:
+        row = StoredSession.get_or_none(
+            (StoredSession.user_id == user_id) & (StoredSession.expires_at > time.time())
+        )
+        if row is None:
+            return None
+        return VerificationSession(
+            row.user_id, json.loads(row.file_data), row.verification_token,
+            row.created_at, row.expires_at, row.attempts
+        )
+
+    def consume(self, user_id: int, token: str) -> dict:
+        # A single DELETE ... RETURNING: two workers can never both consume a token
+        rows = StoredSession.delete().where(
+            (StoredSession.user_id == user_id) &
+            (StoredSession.verification_token == token) &
+            (StoredSession.expires_at > time.time())
+        ).returning(StoredSession.file_data).tuples().execute()
+        for (file_data,) in rows:
+            return json.loads(file_data)
+        return None
+
+    def record_attempt(self, user_id: int) -> int:
+        rows = StoredSession.update(attempts=StoredSession.attempts + 1).where(
+            StoredSession.user_id == user_id
+        ).returning(StoredSession.attempts).tuples().execute()
+        for (attempts,) in rows:
+            return attempts
+        return 0
+
+    def remove(self, user_id: int):
+        StoredSession.delete().where(StoredSession.user_id == user_id).execute()
+
+    def expire(self) -> int:
+        return StoredSession.delete().where(StoredSession.expires_at <= time.time()).execute()
+
+    def __len__(self):
+        return StoredSession.select().where(StoredSession.expires_at > time.time()).count()
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    """Session store selected by SESSION_STORE"""
+    if kind == 'sqlite':
+        return SQLiteSessionStore()
+    if kind != 'memory':
+        logger.error(f"Unknown SESSION_STORE '{kind}', using memory")
+    return MemorySessionStore()
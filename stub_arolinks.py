@@ -0,0 +1,78 @@
+"""Local stand-in for the Arolinks API, for running the bot and shortener offline.
+
+    python stub_arolinks.py --port 8081 --latency 0.2 --error-rate 0.1
+    AROLINKS_API_URL=http://127.0.0.1:8081/api python bot.py
+"""
+import asyncio
+import random
+import argparse
+import logging
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+class StubArolinks:
+    """Answers GET /api like arolinks.com, with injectable latency and failures"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self.links = {}  # alias -> destination url
+
+    async def handle_api(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=self.error_status, text="stub failure")
+
+        url = request.query.get('url')
+        if not request.query.get('api') or not url:
+            return web.json_response({'status': 'error', 'message': 'api and url are required'})
+
+        alias = request.query.get('alias') or f"s{self.requests}"
+        self.links[alias] = url
+        return web.json_response({
+            'status': 'success',
+            'shortenedUrl': f"{request.scheme}://{request.host}/{alias}"
+        })
+
+    async def handle_redirect(self, request: web.Request) -> web.Response:
+        url = self.links.get(request.match_info['alias'])
+        if url is None:
+            raise web.HTTPNotFound()
+        raise web.HTTPFound(url)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api', self.handle_api)
+        app.router.add_get('/{alias}', self.handle_redirect)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> tuple:
+        """Serve in the running loop; returns (runner, api_url)"""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{bound_port}/api"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of API calls answered with 503')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stub = StubArolinks(args.latency, args.error_rate)
+    web.run_app(stub.make_app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
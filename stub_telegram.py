@@ -0,0 +1,318 @@
+"""Local stand-in for the Telegram Bot API, for running and load-testing the bot offline.
+
+Updates come from a JSON-lines fixture (one Update object per line) or are
+generated, and are either served through getUpdates (polling mode) or pushed to
+the bot's webhook:
+
+    python stub_telegram.py --port 8082 --synthetic 5000
+    TELEGRAM_API_URL=http://127.0.0.1:8082/bot python bot.py
+
+    UPDATE_MODE=webhook WEBHOOK_PORT=8443 TELEGRAM_API_URL=http://127.0.0.1:8082/bot python bot.py
+    python stub_telegram.py --port 8082 --fixture updates.jsonl --push http://127.0.0.1:8443/telegram
+"""
+import json
+import time
+import zlib
+import random
+import asyncio
+import argparse
+import logging
+from collections import Counter, deque, defaultdict
+from aiohttp import web, ClientSession
+from telegram.request import BaseRequest
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_QUERIES = (
+    'python', 'physics', 'calculus', 'organic chemistry', 'history of india', 'data structures',
+    'machine learning', 'economics', 'biology ncert', 'linear algebra', 'english grammar', 'pythn'
+)
+
+FLOOD_EXEMPT = frozenset({'getMe', 'deleteWebhook', 'setWebhook', 'answerCallbackQuery', 'answerInlineQuery'})
+
+def synthetic_updates(count: int, users: int = 500, queries=SYNTHETIC_QUERIES) -> list:
+    """Private text messages from `users` distinct users"""
+    now = int(time.time())
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = random.randint(1, users)
+        updates.append({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': now,
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+                'text': random.choice(queries)
+            }
+        })
+    return updates
+
+def load_fixture(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class StubTelegram:
+    """Answers Bot API methods with canned objects and hands out queued updates"""
+
+    def __init__(self, updates: list = (), latency: float = 0.0, chat_limit: int = 0, global_limit: int = 0,
+                 error_rate: float = 0.0, error_status: int = 502, dead_rate: float = 0.0):
+        self.updates = list(updates)
+        self.latency = latency
+        # Injected failures: a fraction of non-polling calls answered with error_status
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.injected_errors = 0
+        # Deleted files: a fixed fraction of file_ids and, independently, of channel messages are rejected
+        self.dead_rate = dead_rate
+        self.dead_rejections = 0
+        # Flood control: more than the limit in any one-second window is answered with 429
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.chat_sends = defaultdict(deque)  # chat_id -> recent send times
+        self.global_sends = deque()
+        self.flood_errors = 0
+        self.delivered = 0  # updates confirmed through getUpdates offsets
+        self.calls = Counter()  # method -> count
+        self.next_message_id = 1
+        self.started_at = None
+        self.new_updates = asyncio.Event()
+        self.observers = []  # called with (method, params, result) for every successful call
+
+    def add_updates(self, updates: list):
+        self.updates.extend(updates)
+        self.new_updates.set()
+
+    def make_message(self, params: dict) -> dict:
+        message_id = self.next_message_id
+        self.next_message_id += 1
+        try:
+            chat_id = int(params.get('chat_id', 0))
+        except ValueError:
+            chat_id = 0
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', '')
+        }
+
+    def dead(self, key) -> bool:
+        return zlib.crc32(str(key).encode()) % 10000 < self.dead_rate * 10000
+
+    def rejection(self, method: str, params: dict):
+        """The 400 Telegram answers for a dead file_id or channel message, or None"""
+        if method == 'sendDocument' and self.dead(params.get('document')):
+            return 'Bad Request: wrong file identifier/HTTP URL specified'
+        if method == 'forwardMessage' and self.dead(params.get('message_id')):
+            return 'Bad Request: message to forward not found'
+        return None
+
+    def flooded(self, params: dict) -> bool:
+        now = time.monotonic()
+        windows = [(self.global_sends, self.global_limit)]
+        if 'chat_id' in params:
+            windows.append((self.chat_sends[str(params['chat_id'])], self.chat_limit))
+        for sends, limit in windows:
+            while sends and sends[0] <= now - 1:
+                sends.popleft()
+            if limit and len(sends) >= limit:
+                return True
+        for sends, _ in windows:
+            sends.append(now)
+        return False
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset', 0) or 0)
+        limit = int(params.get('limit', 100) or 100)
+        timeout = float(params.get('timeout', 0) or 0)
+        # Offsets confirm everything before them, as in the real API
+        if offset:
+            while self.delivered < len(self.updates) and self.updates[self.delivered]['update_id'] < offset:
+                self.delivered += 1
+        pending = self.updates[self.delivered:self.delivered + limit]
+        if not pending and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            pending = self.updates[self.delivered:self.delivered + limit]
+        if pending and self.started_at is None:
+            self.started_at = time.monotonic()
+        return pending
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        status, payload = await self.call(request.match_info['method'], params)
+        return web.json_response(payload, status=status)
+
+    async def call(self, method: str, params: dict) -> tuple:
+        """Answer one Bot API call, returning (HTTP status, response body)"""
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self.get_updates(params)}
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and method != 'getMe' and random.random() < self.error_rate:
+            self.injected_errors += 1
+            return self.error_status, {
+                'ok': False, 'error_code': self.error_status, 'description': 'Bad Gateway'
+            }
+        if method not in FLOOD_EXEMPT and self.flooded(params):
+            self.flood_errors += 1
+            return 429, {
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1}
+            }
+        description = self.rejection(method, params) if self.dead_rate else None
+        if description:
+            self.dead_rejections += 1
+            return 400, {'ok': False, 'error_code': 400, 'description': description}
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot',
+                      'can_join_groups': False, 'can_read_all_group_messages': False,
+                      'supports_inline_queries': True}
+        elif method in ('sendMessage', 'editMessageText', 'sendDocument', 'forwardMessage', 'copyMessage'):
+            result = self.make_message(params)
+            if method == 'sendDocument':
+                result['document'] = {'file_id': params.get('document'), 'file_unique_id': str(params.get('document'))}
+            elif method == 'forwardMessage':
+                # The file_id the bot would see on the forwarded copy
+                source = f"{params.get('from_chat_id')}_{params.get('message_id')}"
+                result['document'] = {'file_id': f"BQAC_{source}", 'file_unique_id': source}
+        else:
+            result = True
+        for observer in self.observers:
+            observer(method, params, result)
+        return 200, {'ok': True, 'result': result}
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'updates': len(self.updates),
+            'delivered': self.delivered,
+            'flood_errors': self.flood_errors,
+            'injected_errors': self.injected_errors,
+            'dead_rejections': self.dead_rejections,
+            'elapsed': round(elapsed, 3),
+            'calls': dict(self.calls)
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/stats', self.handle_stats)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> tuple:
+        """Serve in the running loop; returns (runner, base_url for TELEGRAM_API_URL)"""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{bound_port}/bot"
+
+class StubRequest(BaseRequest):
+    """In-process transport to a StubTelegram, for measuring the bot without sockets
+
+    Parameters are encoded exactly as for HTTP and results decoded by the bot as usual.
+    """
+
+    def __init__(self, stub: StubTelegram):
+        self.stub = stub
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None) -> tuple:
+        params = request_data.json_parameters if request_data is not None else {}
+        status, payload = await self.stub.call(url.rsplit('/', 1)[-1], params)
+        return status, json.dumps(payload).encode('utf-8')
+
+async def push_updates(url: str, updates: list, secret: str = None, concurrency: int = 20) -> dict:
+    """POST updates to a webhook, retrying refusals the way Telegram does; returns timing and status counts"""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    statuses = Counter()
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async def sender(session):
+        while not queue.empty():
+            update = queue.get_nowait()
+            while True:
+                async with session.post(url, json=update, headers=headers) as response:
+                    statuses[response.status] += 1
+                    if response.status != 503:
+                        break
+                await asyncio.sleep(float(response.headers.get('Retry-After', 1)) * random.random())
+
+    started = time.monotonic()
+    async with ClientSession() as session:
+        await asyncio.gather(*(sender(session) for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    return {
+        'updates': len(updates),
+        'elapsed': round(elapsed, 3),
+        'updates_per_second': round(len(updates) / elapsed, 1) if elapsed else None,
+        'statuses': dict(statuses)
+    }
+
+async def serve(args):
+    updates = load_fixture(args.fixture) if args.fixture else synthetic_updates(args.synthetic, args.users)
+    stub = StubTelegram(latency=args.latency, chat_limit=args.chat_limit, global_limit=args.global_limit,
+                        error_rate=args.error_rate, dead_rate=args.dead_rate)
+    runner, base_url = await stub.start(args.host, args.port)
+    logger.info(f"Stub Bot API at {base_url} with {len(updates)} updates")
+    try:
+        if args.push:
+            await asyncio.sleep(args.push_delay)
+            logger.info(json.dumps(await push_updates(args.push, updates, args.secret, args.concurrency)))
+        else:
+            stub.add_updates(updates)
+        while True:
+            await asyncio.sleep(5)
+            logger.info(json.dumps(stub.stats()))
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--fixture', help='JSON-lines file of Update objects')
+    parser.add_argument('--synthetic', type=int, default=1000, help='generated updates when no fixture is given')
+    parser.add_argument('--users', type=int, default=500, help='distinct users in generated updates')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every Bot API call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of Bot API calls answered with 502')
+    parser.add_argument('--dead-rate', type=float, default=0.0,
+                        help='fraction of file_ids and of channel messages that no longer exist')
+    parser.add_argument('--chat-limit', type=int, default=0, help='calls per chat per second before 429 (0 = unlimited)')
+    parser.add_argument('--global-limit', type=int, default=0, help='calls per second before 429 (0 = unlimited)')
+    parser.add_argument('--push', help='webhook URL to POST updates to instead of serving getUpdates')
+    parser.add_argument('--push-delay', type=float, default=2.0, help='seconds to wait for the bot before pushing')
+    parser.add_argument('--secret', help='webhook secret token')
+    parser.add_argument('--concurrency', type=int, default=20, help='parallel webhook connections')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
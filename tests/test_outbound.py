@@ -0,0 +1,113 @@
+import time
+import asyncio
+
+from telegram.ext import ExtBot
+
+from outbound import OutboundScheduler, PRIORITY_COSMETIC
+from stub_telegram import StubTelegram, StubRequest
+
+CHAT_ID = 42
+
+
+def run_bot(stub: StubTelegram, scheduler: OutboundScheduler, scenario):
+    """Run scenario(bot) with a bot whose calls go through scheduler to the stub"""
+    async def main():
+        bot = ExtBot('1:stub', request=StubRequest(stub), get_updates_request=StubRequest(stub),
+                     rate_limiter=scheduler)
+        async with bot:
+            return await scenario(bot)
+    return asyncio.run(main())
+
+
+def record_calls(stub: StubTelegram) -> list:
+    """(monotonic time, method, params) of every call the stub answers"""
+    calls = []
+    stub.observers.append(lambda method, params, result: calls.append((time.monotonic(), method, params)))
+    return calls
+
+
+def test_messages_to_one_chat_are_paced():
+    stub = StubTelegram()
+    calls = record_calls(stub)
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000, chat_rate=20, chat_burst=1)
+
+    async def scenario(bot):
+        await asyncio.gather(*(bot.send_message(CHAT_ID, f"message {i}") for i in range(5)))
+        await asyncio.gather(*(bot.send_message(chat_id, "other chat") for chat_id in range(100, 105)))
+
+    started = time.monotonic()
+    run_bot(stub, scheduler, scenario)
+
+    sent = [(at, params) for at, method, params in calls if method == 'sendMessage']
+    to_chat = [at for at, params in sent if params['chat_id'] == str(CHAT_ID)]
+    assert len(to_chat) == 5
+    # Burst of one, then one message every 50ms
+    assert to_chat[-1] - to_chat[0] >= 4 / 20 * 0.9
+    # Other chats have their own buckets and go out at once
+    others = [at for at, params in sent if params['chat_id'] != str(CHAT_ID)]
+    assert len(others) == 5
+    assert others[-1] - others[0] < 1 / 20
+    assert time.monotonic() - started < 2
+
+
+def test_retry_after_pauses_and_resends():
+    # The stub allows one call a second per chat and answers the rest with retry_after=1
+    stub = StubTelegram(chat_limit=1)
+    calls = record_calls(stub)
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000, chat_rate=100, chat_burst=10)
+
+    async def scenario(bot):
+        return await asyncio.gather(*(bot.send_message(CHAT_ID, f"message {i}") for i in range(2)))
+
+    messages = run_bot(stub, scheduler, scenario)
+
+    assert [message.text for message in messages] == ["message 0", "message 1"]
+    assert stub.flood_errors == 1
+    assert scheduler.retried == 1
+    sent = [at for at, method, _ in calls if method == 'sendMessage']
+    assert sent[1] - sent[0] >= 0.9
+
+
+def test_queued_edits_of_a_message_merge():
+    stub = StubTelegram()
+    calls = record_calls(stub)
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000, chat_rate=10, chat_burst=1)
+
+    async def scenario(bot):
+        message = await bot.send_message(CHAT_ID, "Searching...")
+        edits = [
+            bot.edit_message_text(f"page {page}", chat_id=CHAT_ID, message_id=message.message_id)
+            for page in range(1, 6)
+        ]
+        return await asyncio.gather(*edits)
+
+    results = run_bot(stub, scheduler, scenario)
+
+    edits = [params for _, method, params in calls if method == 'editMessageText']
+    # Waiting behind the send, the first edit takes the later ones' text; only the last is sent
+    assert [params['text'] for params in edits] == ["page 5"]
+    assert scheduler.merged == 4
+    assert len(results) == 5
+
+
+def test_answers_go_before_progress_notes():
+    stub = StubTelegram()
+    calls = record_calls(stub)
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000, chat_rate=20, chat_burst=1)
+
+    async def scenario(bot):
+        message = await bot.send_message(CHAT_ID, "Searching...")
+        progress = asyncio.ensure_future(bot.edit_message_text(
+            "Please wait...", chat_id=CHAT_ID, message_id=message.message_id + 1,
+            rate_limit_args=PRIORITY_COSMETIC
+        ))
+        action = asyncio.ensure_future(bot.send_chat_action(CHAT_ID, 'typing'))
+        await asyncio.sleep(0)
+        page = bot.edit_message_text("page 1", chat_id=CHAT_ID, message_id=message.message_id)
+        await asyncio.gather(progress, action, page)
+
+    run_bot(stub, scheduler, scenario)
+
+    order = [params.get('text', method) for _, method, params in calls if method != 'getMe']
+    assert order[:2] == ["Searching...", "page 1"]
+    assert set(order[2:]) == {"Please wait...", 'sendChatAction'}
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+from config import UPDATE_WORKERS, USER_MAX_PENDING_UPDATES, INLINE_DEBOUNCE, UPDATE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+class UserLane:
+    """Updates from one user, run strictly one after another"""
+    __slots__ = ('lock', 'pending', 'latest_page')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # FIFO, so updates keep their arrival order
+        self.pending = 0
+        self.latest_page = {}  # message_id -> update_id of the newest page_ callback
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Handle updates concurrently across users while keeping each user's updates in order
+
+    Updates from the same user share user_data and verification state, so they run
+    one at a time; different users run in parallel on up to `workers` handlers.
+    Queued page_ callbacks on a message are superseded by newer ones for it.
+
+    PTB spawns a task per update as soon as it leaves the update queue, so the
+    bounds are taken before that (see UpdateQueue): an update needs one of
+    `capacity` slots to be queued at all and keeps it until its handling
+    finishes. A user holds at most `max_pending` of them; their updates past
+    that are dropped at the queue, whatever their type, so a flood waits on
+    its own lane without taking the slots everyone else needs. `screen`, if
+    given, drops updates there too: it returns True for an update whose
+    handler would refuse it without a word, e.g. over a rate limit.
+
+    Inline queries only read the index, so they skip the user's lane. Each waits
+    `debounce` seconds first and is dropped if the user typed more meanwhile,
+    so a burst of keystrokes costs one search.
+    """
+
+    def __init__(self, workers: int = UPDATE_WORKERS, max_pending: int = USER_MAX_PENDING_UPDATES,
+                 debounce: float = INLINE_DEBOUNCE, capacity: int = UPDATE_QUEUE_SIZE, screen=None):
+        # Slots bound the updates admitted; a smaller base semaphore would fill with one user's
+        # updates waiting on their lane. `workers` bounds the handlers actually running
+        super().__init__(capacity)
+        self.workers = asyncio.BoundedSemaphore(workers)
+        self.max_pending = max_pending
+        self.lanes = {}  # user or chat id -> UserLane
+        self.debounce = debounce
+        self.latest_inline = {}  # user_id -> update_id of the newest inline query
+        self.capacity = capacity
+        self.admitted = 0  # updates holding a slot: queued, waiting on their user or running
+        self.held = {}  # user or chat id -> slots its updates hold
+        self.room = asyncio.Event()
+        self.answering = set()  # answers to dropped callbacks still in flight
+        self.screen = screen
+        self.screened = 0
+        self.dropped = 0
+        self.merged = 0
+
+    def shed(self, update: object) -> bool:
+        """Drop an update whose user already holds `max_pending` slots, or that `screen` refuses; True if dropped"""
+        if self.screen is not None and isinstance(update, Update) and self.screen(update):
+            self.screened += 1
+            self.answer_later(update)
+            return True
+        key = self.lane_key(update)
+        if key is None or self.held.get(key, 0) < self.max_pending:
+            return False
+        self.dropped += 1
+        self.answer_later(update)
+        return True
+
+    def try_admit(self, update: object) -> bool:
+        """Take a slot for an update about to be queued; False if all `capacity` are held"""
+        if not isinstance(update, Update):
+            return True  # PTB's stop signal and custom updates are not bounded
+        if self.admitted >= self.capacity:
+            return False
+        self.admitted += 1
+        key = self.lane_key(update)
+        if key is not None:
+            self.held[key] = self.held.get(key, 0) + 1
+        return True
+
+    async def admit(self, update: object) -> None:
+        while not self.try_admit(update):
+            self.room.clear()
+            await self.room.wait()
+
+    def release(self, update: object) -> None:
+        if isinstance(update, Update):
+            self.admitted -= 1
+            key = self.lane_key(update)
+            if key is not None:
+                held = self.held[key] - 1
+                if held:
+                    self.held[key] = held
+                else:
+                    del self.held[key]
+            self.room.set()
+
+    @staticmethod
+    async def answer(update: object) -> None:
+        """Stop the client's spinner on a callback that will not be handled"""
+        if not isinstance(update, Update) or update.callback_query is None:
+            return
+        try:
+            await update.callback_query.answer()
+        except TelegramError as e:
+            logger.debug(f"Answering a dropped callback failed: {e}")
+
+    def answer_later(self, update: object) -> None:
+        if isinstance(update, Update) and update.callback_query is not None:
+            task = asyncio.ensure_future(self.answer(update))
+            self.answering.add(task)
+            task.add_done_callback(self.answering.discard)
+
+    async def process_update(self, update: object, coroutine) -> None:
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.release(update)
+
+    @staticmethod
+    def lane_key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    @staticmethod
+    def page_message(update: object):
+        """message_id a page_ callback would redraw, or None for any other update"""
+        if not isinstance(update, Update):
+            return None
+        query = update.callback_query
+        if query is None or query.message is None or not (query.data or '').startswith('page_'):
+            return None
+        return query.message.message_id
+
+    async def process_inline(self, update: Update, coroutine) -> None:
+        user_id = update.inline_query.from_user.id
+        self.latest_inline[user_id] = update.update_id
+        try:
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+            if self.latest_inline.get(user_id) != update.update_id:
+                self.merged += 1
+                coroutine.close()
+                return
+            async with self.workers:
+                await coroutine
+        finally:
+            if self.latest_inline.get(user_id) == update.update_id:
+                del self.latest_inline[user_id]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if isinstance(update, Update) and update.inline_query is not None:
+            await self.process_inline(update, coroutine)
+            return
+
+        key = self.lane_key(update)
+        if key is None:
+            async with self.workers:
+                await coroutine
+            return
+
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = UserLane()
+        message_id = self.page_message(update)
+        if message_id is not None:
+            lane.latest_page[message_id] = update.update_id
+
+        lane.pending += 1
+        try:
+            async with lane.lock:
+                if message_id is not None and lane.latest_page.get(message_id) != update.update_id:
+                    # A newer page of the same message is queued behind us; only it needs drawing
+                    self.merged += 1
+                    coroutine.close()
+                    await self.answer(update)
+                    return
+                async with self.workers:
+                    await coroutine
+        finally:
+            if message_id is not None and lane.latest_page.get(message_id) == update.update_id:
+                del lane.latest_page[message_id]
+            lane.pending -= 1
+            if not lane.pending:
+                del self.lanes[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self.dropped or self.merged or self.screened:
+            logger.info(f"Update processor: {self.dropped} updates dropped, {self.merged} superseded, "
+                        f"{self.screened} refused before queueing")
+
+class UpdateQueue(asyncio.Queue):
+    """The application's update_queue, admitting an update only with a slot from the processor
+
+    The poller's put() waits for a slot, leaving further updates with
+    Telegram; the webhook's put_nowait() raises QueueFull, answered with 503.
+    An update from a user already at their limit is accepted and dropped
+    instead: holding it back would hold back every user behind it.
+    """
+
+    def __init__(self, processor: UserOrderedUpdateProcessor):
+        super().__init__()
+        self.processor = processor
+
+    async def put(self, item) -> None:
+        if self.processor.shed(item):
+            return
+        await self.processor.admit(item)
+        super().put_nowait(item)
+
+    def put_nowait(self, item) -> None:
+        if self.processor.shed(item):
+            return
+        if not self.processor.try_admit(item):
+            raise asyncio.QueueFull
+        super().put_nowait(item)
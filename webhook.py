@@ -0,0 +1,100 @@
+import hmac
+import json
+import asyncio
+import logging
+import signal
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """Accepts Telegram updates over HTTP and queues them for the application
+
+    The queue is bounded: when it is full the update is refused with 503 and
+    Telegram (or the replay tool) delivers it again later, instead of the bot
+    buffering without limit.
+    """
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET):
+        self.application = application
+        self.path = path
+        self.secret = secret.encode() if secret else None
+        self.accepted = 0
+        self.rejected = 0
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret is not None:
+            supplied = request.headers.get(SECRET_HEADER, '').encode()
+            if not hmac.compare_digest(supplied, self.secret):
+                raise web.HTTPForbidden()
+
+        try:
+            data = await request.json(loads=json.loads)
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Malformed webhook update: {e}")
+            raise web.HTTPBadRequest()
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503, headers={'Retry-After': '1'})
+
+        self.accepted += 1
+        return web.Response()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        return app
+
+    async def start(self, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT) -> web.AppRunner:
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Webhook listening on {host}:{port}{self.path}")
+        return runner
+
+async def serve_webhook(application: Application, stop_signals=(signal.SIGINT, signal.SIGTERM)):
+    """Run the application on a webhook until a stop signal, mirroring run_polling's lifecycle"""
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in stop_signals:
+        loop.add_signal_handler(sig, stopped.set)
+
+    server = WebhookServer(application)
+    runner = None
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        runner = await server.start()
+        await application.start()
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await stopped.wait()
+    finally:
+        logger.info(f"Webhook stopping: {server.accepted} updates accepted, {server.rejected} refused")
+        if runner is not None:
+            await runner.cleanup()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)